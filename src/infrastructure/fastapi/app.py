@@ -1,19 +1,27 @@
 from src.ml.checker_state import State
-from src.ml.alpha_zero.pv_mcts import pv_mcts_scores
-from src.ml.alpha_zero.dual_network import (
-    DN_OUTPUT_SIZE,
-    action_to_index,
-)
+from src.ml.move import move_to_action
+from src.ml.alpha_zero.pv_mcts import pv_mcts_scores, boltzman
+from src.ml.alpha_zero.opening_book import load_opening_book
+from src.ml.tablebase import get_tablebase
 from src.infrastructure.aws.s3 import load_model_from_s3
 
 from fastapi import FastAPI
 from pydantic import BaseModel
+from dotenv import load_dotenv
 import numpy as np
+import time
+import os
 
 
 app = FastAPI()
 
+load_dotenv()
 SP_TEMPERATURE = 1.0
+# 1リクエストあたりの探索時間の上限（秒）。シミュレーション回数に達するか、
+# この時間を過ぎた時点の訪問回数で手を選ぶ
+PREDICT_TIME_LIMIT = float(os.getenv("PREDICT_TIME_LIMIT", "1.0"))
+# 探索スレッド数（2以上なら推論の待ち時間の間に他のスレッドが木を進める）
+PREDICT_THREADS = int(os.getenv("PREDICT_THREADS", "1"))
 
 
 class RequestState(BaseModel):
@@ -35,35 +43,46 @@ class RequestState(BaseModel):
     turn_count: int
 
 
-def predict(model, state: State):
-    # 合法手の確率分布の取得 (legal_actions と同じ順序)
-    scores = pv_mcts_scores(state, model, SP_TEMPERATURE)
-    legal_actions = state.legal_actions()  # [(fr,fc,tr,tc,captured_list), ...]
-    # ポリシーベクトル（全行動空間分 = DN_OUTPUT_SIZE）を0で初期化
-    policies = [0.0] * DN_OUTPUT_SIZE
-    # 合法手それぞれに対応する index を立てる
-    for (fr, fc, tr, tc, captured), policy in zip(legal_actions, scores):
-        idx = action_to_index(fr, fc, tr, tc)
-        policies[idx] = policy
-    # # 盤面のコピーを保存（後で State を再構成してもいいし、そのまま平面にしてもいい）
-    # board_copy = [row[:] for row in state.board]
-    # turn_copy = state.turn
+def predict(model, state: State, opening_book=None, deadline=None):
+    # 定跡にある局面は探索せずに、保存した訪問回数の分布から選ぶ
+    if opening_book is not None:
+        hit = opening_book.lookup(state)
+        # キーの衝突や古いルールで作ったブックの手は使わずに探索する
+        if hit is not None and hit[0] == state.legal_moves():
+            moves, visits = hit
+            scores = boltzman(visits.tolist(), SP_TEMPERATURE)
+            action_idx = np.random.choice(len(moves), p=scores)
+            return move_to_action(moves[action_idx], state)
+
+    # 終盤データベースにある局面は探索せずに最善手を返す
+    tablebase = get_tablebase()
+    if tablebase is not None:
+        move = tablebase.best_move(state)
+        if move is not None:
+            return move_to_action(move, state)
+
+    # 合法手の確率分布の取得 (legal_moves と同じ順序)
+    scores = pv_mcts_scores(
+        state, model, SP_TEMPERATURE, deadline=deadline, threads=PREDICT_THREADS
+    )
+    legal_moves = state.legal_moves()  # パック形式の手のリスト
     # 行動の取得
-    # np.random.choice(legal_actions, p=...) はエラーになるので、
     # インデックスをサンプリングしてから実際の行動を取る
-    action_idx = np.random.choice(len(legal_actions), p=scores)
-    action = legal_actions[action_idx]  # (fr, fc, tr, tc, captured)
-    return action
+    action_idx = np.random.choice(len(legal_moves), p=scores)
+    # レスポンス用に (fr, fc, tr, tc, captured) へ戻す
+    return move_to_action(legal_moves[action_idx], state)
 
 
 # application layer
 def get_action_by_pv_mcts(req: RequestState):
+    # 探索の締め切り（リクエストを受けた時刻から数える）
+    deadline = time.monotonic() + PREDICT_TIME_LIMIT
     # チェッカーの状態を State オブジェクトに変換
     state = State(req.board, req.turn, req.turn_count)
     # モデルの読み込み
     model = app.state.model
     # 行動の予測
-    pred = predict(model, state)
+    pred = predict(model, state, app.state.opening_book, deadline)
 
     return {
         "selected_piece": [pred[0], pred[1]],
@@ -78,6 +97,10 @@ def skd_startup():
     try:
         print("モデルをS3からロード中...")
         app.state.model = load_model_from_s3("saved_models", "best.keras")
+        # 定跡（S3 になければ、または別のモデルで作ったものなら None で、毎回探索する）
+        app.state.opening_book = load_opening_book(app.state.model)
+        # 終盤データベース（TABLEBASE_PATH が設定されていれば）
+        get_tablebase()
     except Exception as e:
         print(f"モデルのロードに失敗しました: {e}")
         raise e
@@ -0,0 +1,63 @@
+# 盤面 -> NN 入力テンソル の変換（探索・学習で共通）
+#
+# (N, 6, 6) の盤面配列と手番から (N, 6, 6, 4) の float32 テンソルを NumPy の比較だけで作る。
+# 探索 (pv_mcts.predict_batch) も学習 (train_network) もここを通すので、入力の定義は1か所だけ。
+# チャンネル定義:
+#   0: 手番側の通常駒
+#   1: 手番側のキング
+#   2: 相手側の通常駒
+#   3: 相手側のキング
+
+from src.ml.bitboard import BOARD_SIZE, RED, BLUE, SQUARES, NUM_SQUARES
+
+import numpy as np
+
+NUM_PLANES = 4
+
+# 手番側から見た駒の値（盤面の値 × 手番）-> チャンネル順
+_PLANE_VALUES = np.array([1, 2, -1, -2], dtype=np.int8)
+
+# 黒マス番号 -> 6x6 を平らにしたときの index
+_CELL_OF_SQUARE = np.array([r * BOARD_SIZE + c for r, c in SQUARES], dtype=np.int64)
+# 黒マス番号（ビット位置）
+_SQUARE_SHIFTS = np.arange(NUM_SQUARES, dtype=np.int64)
+# State.bits の順 (red_men, red_kings, blue_men, blue_kings) の駒の値
+_BITS_VALUES = np.array([RED, 2 * RED, BLUE, 2 * BLUE], dtype=np.int64)
+
+
+def encode_boards(boards, turns, out=None):
+    """
+    boards: (N, 6, 6) の int8 配列（値は State.board と同じ 0, ±1, ±2）
+    turns : (N,) 手番（正を RED、負を BLUE とみなす）
+    out   : 書き込み先の (N, 6, 6, 4) float32 配列（None なら新しく作る）
+    返り値: (N, 6, 6, 4) の float32 テンソル
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    turns = np.asarray(turns)
+    if out is None:
+        out = np.empty((len(boards), BOARD_SIZE, BOARD_SIZE, NUM_PLANES), dtype=np.float32)
+
+    # 手番側を正、相手側を負にそろえて、チャンネルごとの値と比べる
+    sign = np.where(turns > 0, 1, -1).astype(np.int8)
+    rel = boards * sign[:, None, None]
+    # (N, 6, 6, 4) に一度に比べるよりチャンネルごとに書く方が速い（ループは4回だけ）
+    for plane, value in enumerate(_PLANE_VALUES):
+        np.equal(rel, value, out=out[..., plane])
+    return out
+
+
+# State のビットボードから (N, 6, 6) の盤面配列を作る（State.board の2次元リストを経由しない）
+def states_to_boards(states):
+    """states の盤面を (N, 6, 6) の int8 配列にまとめる"""
+    n = len(states)
+    bits = np.array([state.bits for state in states], dtype=np.int64).reshape(n, 4)
+    occupied = bits[:, :, None] >> _SQUARE_SHIFTS & 1  # (N, 4, 18)
+    boards = np.zeros((n, BOARD_SIZE * BOARD_SIZE), dtype=np.int8)
+    boards[:, _CELL_OF_SQUARE] = _BITS_VALUES @ occupied
+    return boards.reshape(n, BOARD_SIZE, BOARD_SIZE)
+
+
+def encode_states(states, out=None):
+    """states を (N, 6, 6, 4) の NN 入力テンソルに変換する"""
+    turns = [state.turn for state in states]
+    return encode_boards(states_to_boards(states), turns, out=out)
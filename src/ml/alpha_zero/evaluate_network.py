@@ -1,4 +1,5 @@
 from src.ml.alpha_zero.pv_mcts import pv_mcts_action
+from src.ml.alpha_zero.nn_cache import get_nn_cache
 from src.ml.evaluate import evaluate_algorithm_of
 from src.infrastructure.aws.s3 import (
     load_model_from_s3,
@@ -62,6 +63,19 @@ def evaluate_network():
         EP_GAME_COUNT=EN_GAME_COUNT,
     )
 
+    # NN キャッシュの効き具合と、探索の打ち切りで省いたシミュレーション回数
+    stats = get_nn_cache().stats()
+    print(
+        f"NN cache: hits {stats['hits']} / misses {stats['misses']} "
+        f"({stats['hit_rate']:.1%}), {stats['entries']} entries, {stats['bytes']} bytes"
+    )
+    for name, player in (("latest", latest_player), ("best", best_player)):
+        search = player.search
+        print(
+            f"PV-MCTS ({name}): {search.simulations} simulations, "
+            f"saved {search.saved_simulations}"
+        )
+
     # モデルの破棄
     K.clear_session()
     del latest_model
@@ -0,0 +1,388 @@
+# PV-MCTS の探索木（配列版）
+#
+# ノードごとに Python オブジェクトを作る代わりに、ノードの統計を NumPy 配列で持つ。
+# 子ノードは親ごとに連続したスロットに確保するので、
+# 子の一覧は first_child[node] から num_children[node] 個の範囲になり、
+# PUCT による子の選択は NumPy の1式で計算できる。
+# 配列は CHUNK_SIZE 単位で伸ばす。
+# 手を進めたときは reroot() で指した手の部分木だけを詰め直して残す。
+#
+# 置換表（手順違いで同じ局面への合流）:
+#   スロットは「親からの手（辺）」で、N・V・P は辺ごとに持つ。
+#   同じ局面 (State.key) に最初に着いたスロットを代表とし、局面の統計
+#   （node_N・W）と子（NN の出力から展開したもの）は代表スロットだけが持つ。
+#   後から同じ局面に着いたスロットは link で代表を指し、代表の子をたどる。
+#   Q は代表の統計（全経路の合計）から、探索項は辺の N から計算する。
+#   手数も局面キーに含まれるので、合流するのは同じ深さのノードだけ（閉路はない）。
+#
+# 勝敗の証明（MCTS-Solver）:
+#   proven は局面の手番側から見た確定した勝敗（1: 勝ち, -1: 負け, 0: 未確定）。
+#   終局・終盤データベースの葉で確定し、子に負け（相手の負け）が1つでもあれば勝ち、
+#   子が全て勝ち（相手の勝ち）なら負けとして親へさかのぼる。引き分けは確定として扱わない。
+#   確定した局面へは降りず、確定した子は選択で除く（相手の負けになる手は必ず選ぶ）。
+#
+# 1回のシミュレーションは select_leaf（ルートから葉への降下をループで1本の経路配列に
+# 書き込む）と backup（経路を1回なめて更新）の2段で、再帰呼び出しはない。
+# Numba があれば降下と逆伝播は JIT 版のループ (_descend, _backup) を使い、
+# なければ子ごとの計算を NumPy でまとめる select_child / 配列演算の backup を使う（結果は同じ）。
+
+from src.ml.checker_state import State
+from src.ml.bitboard import DRAW_TURN_COUNT
+from src.ml import jit_moves
+from src.ml.jit_moves import njit
+
+from math import sqrt, inf
+import numpy as np
+
+# 配列を伸ばす単位（ノード数）
+CHUNK_SIZE = 4096
+# PUCT の探索の強さ
+C_PUCT = 1.0
+# ルートノードのスロット
+ROOT = 0
+# 逆伝播の符号（葉から数えて偶数段目は +、奇数段目は -）
+_SIGNS = np.array([(-1.0) ** i for i in range(256)])
+# 辺ごとの配列と未使用スロットの初期値
+_EDGE_FIELDS = (
+    ("N", 0),
+    ("V", 0),
+    ("P", 0),
+    ("parent", -1),
+    ("action", -1),
+)
+# 局面ごとの配列（代表スロットだけが使う）と未使用スロットの初期値
+_NODE_FIELDS = (
+    ("node_N", 0),
+    ("W", 0),
+    ("first_child", -1),
+    ("num_children", 0),
+    ("proven", 0),
+)
+
+
+class MCTSTree:
+    def __init__(self, state: State, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.capacity = 0
+        self.size = 0
+        self.N = np.zeros(0, dtype=np.int64)  # 辺の試行回数
+        self.V = np.zeros(0, dtype=np.int64)  # 辺の評価待ちの試行回数（仮想損失）
+        self.P = np.zeros(0, dtype=np.float64)  # 事前確率（親から見たこの手のポリシー）
+        self.parent = np.zeros(0, dtype=np.int64)  # 親ノード（ルートは -1）
+        self.action = np.zeros(0, dtype=np.int64)  # 親からこのノードへの手（パック形式）
+        self.link = np.zeros(0, dtype=np.int64)  # 同じ局面の代表スロット（自分なら自分）
+        self.node_N = np.zeros(0, dtype=np.int64)  # 局面の試行回数（全経路の合計）
+        self.W = np.zeros(0, dtype=np.float64)  # 局面の累計価値（その局面の手番側から見て）
+        self.first_child = np.zeros(0, dtype=np.int64)  # 最初の子（未展開は -1）
+        self.num_children = np.zeros(0, dtype=np.int64)  # 子の数
+        self.proven = np.zeros(0, dtype=np.int8)  # 確定した勝敗（手番側から見て）
+        self.states = []  # ノードの局面（未作成は None）
+        self.table = {}  # 局面キー -> 代表スロット
+        self._allocate(1)
+        self.states.append(state)
+        self.table[state.key] = ROOT
+
+    # n 個の連続したスロットを確保して先頭を返す
+    def _allocate(self, n: int) -> int:
+        start = self.size
+        if start + n > self.capacity:
+            chunks = -(-(start + n - self.capacity) // self.chunk_size)
+            extra = chunks * self.chunk_size
+            for name, fill in _EDGE_FIELDS + _NODE_FIELDS:
+                arr = getattr(self, name)
+                setattr(
+                    self, name, np.concatenate([arr, np.full(extra, fill, arr.dtype)])
+                )
+            self.link = np.concatenate(
+                [self.link, np.arange(self.capacity, self.capacity + extra)]
+            )
+            self.capacity += extra
+        self.size += n
+        return start
+
+    def is_expanded(self, node: int) -> bool:
+        return self.first_child[node] >= 0
+
+    def children(self, node: int):
+        """子ノードのスロットの範囲（node は代表スロット）"""
+        first = self.first_child[node]
+        return range(first, first + self.num_children[node])
+
+    # 同じ局面の代表スロット
+    def transpose(self, node: int) -> int:
+        """
+        未展開のスロットに初めて着いたときに置換表を引き、同じ局面が既にあれば
+        そのスロットへ link を張る（なければ自分を代表として登録する）。
+        """
+        owner = self.link[node]
+        if owner == node and self.first_child[node] < 0:
+            owner = self.table.setdefault(self.state(node).key, node)
+            self.link[node] = owner
+        return owner
+
+    # ノードの展開（合法手と同じ順に子を並べる）
+    def expand(self, node: int, policies):
+        state = self.states[node]
+        moves = state.legal_moves()
+        first = self._allocate(len(moves))
+        end = first + len(moves)
+        self.P[first:end] = policies
+        self.parent[first:end] = node
+        self.action[first:end] = moves
+        self.first_child[node] = first
+        self.num_children[node] = len(moves)
+        # 子の State は最初に選ばれたときに作る（state() を参照）
+        self.states.extend([None] * len(moves))
+
+    # ノードの局面
+    def state(self, node: int) -> State:
+        """
+        子の State は展開時には作らず、最初に必要になったときに親の局面と手から作る。
+        手順違いで同じ局面になる子は State を共有する。
+        """
+        state = self.states[node]
+        if state is None:
+            parent_state = self.states[self.parent[node]]
+            state = parent_state.next(int(self.action[node])).interned()
+            self.states[node] = state
+        return state
+
+    # 経路配列の長さ（引き分け手数に達した局面は展開しないので、深さはそこまで）
+    def max_path_length(self) -> int:
+        return max(DRAW_TURN_COUNT - self.states[ROOT].turn_count, 0) + 2
+
+    # UCB で葉まで進む（通った子ノードには仮想損失を付ける）
+    def select_leaf(self, path):
+        """
+        path: 経路を書き込む int64 配列（長さ max_path_length() 以上）
+        (経路の長さ, 葉の代表スロット) を返す。経路は path[:長さ]（先頭はルート）。
+        未展開の局面・勝敗が確定した局面で止まる。手順違いで合流した局面は
+        代表スロットの子をたどる（置換表は Python の dict なので、JIT 版は
+        未解決のスロットに着くたびに戻ってきて transpose する）。
+        """
+        path[0] = ROOT
+        depth = 1
+        leaf = self.transpose(ROOT)
+        if jit_moves.AVAILABLE:
+            while self.first_child[leaf] >= 0 and not self.proven[leaf]:
+                depth = _descend(
+                    leaf,
+                    depth,
+                    path,
+                    self.first_child,
+                    self.num_children,
+                    self.link,
+                    self.N,
+                    self.V,
+                    self.W,
+                    self.node_N,
+                    self.P,
+                    self.proven,
+                    C_PUCT,
+                )
+                leaf = self.transpose(path[depth - 1])
+            return depth, leaf
+        while self.first_child[leaf] >= 0 and not self.proven[leaf]:
+            node = self.select_child(leaf)
+            self.V[node] += 1
+            path[depth] = node
+            depth += 1
+            leaf = self.transpose(node)
+        return depth, leaf
+
+    # アーク評価値が最大の子ノードの取得
+    def select_child(self, node: int) -> int:
+        """
+        PUCT = Q + C_PUCT * P * sqrt(Σn) / (1 + n) が最大の子を返す。
+        Q は合流先も含めた局面の統計、n は辺の試行回数。
+        評価待ちの試行（仮想損失）は価値 -1 の試行として数える。
+        """
+        first = int(self.first_child[node])
+        end = first + int(self.num_children[node])
+        owner = self.link[first:end]
+        v = self.V[first:end]
+        n = self.N[first:end] + v
+        # 未訪問 (node_N == 0) の局面は W も V も 0 なので Q = 0 になる
+        q = (self.W[owner] - v) / np.maximum(self.node_N[owner] + v, 1)
+        u = self.P[first:end] * (C_PUCT * sqrt(n.sum())) / (1 + n)
+        score = q + u
+        # 勝敗の確定した子: 相手の勝ちは選ばず、相手の負けは必ず選ぶ
+        proven = self.proven[owner]
+        if proven.any():
+            score[proven == 1] = -np.inf
+            score[proven == -1] = np.inf
+        return first + int(score.argmax())
+
+    # 葉までの経路の価値を更新
+    def backup(self, path, depth, value):
+        """
+        path: ルートから葉までのスロットの配列（path[:depth] を使う。select_leaf の経路配列そのまま）
+        value: 葉の手番側から見た価値（親に向かって1段ごとに符号が反転する）
+        辺の試行回数は通ったスロットに、価値は局面の代表スロットに足す。
+        経路上の子ノードに付けた仮想損失もここで外す。
+        """
+        if jit_moves.AVAILABLE:
+            _backup(path, depth, value, self.link, self.N, self.V, self.W, self.node_N)
+            return
+        path = path[:depth]
+        owner = self.link[path]  # 深さが違うので経路上で重複しない
+        self.W[owner] += value * _SIGNS[depth - 1 :: -1][:depth]
+        self.node_N[owner] += 1
+        self.N[path] += 1
+        self.V[path[1:]] -= 1
+
+    # 勝敗が確定した葉から、親の勝敗が確定するところまでさかのぼる
+    def prove(self, path, depth, value):
+        """
+        path: ルートから葉までのスロットの配列（path[:depth] を使う）
+        value: 葉の手番側から見た確定した価値（1: 勝ち, -1: 負け, 0 は確定として扱わない）
+        """
+        if value == 0:
+            return
+        self.proven[self.link[path[depth - 1]]] = value
+        for i in range(depth - 2, -1, -1):
+            node = self.link[path[i]]
+            first = self.first_child[node]
+            proven = self.proven[self.link[first : first + self.num_children[node]]]
+            if (proven == -1).any():
+                self.proven[node] = 1
+            elif (proven == 1).all():
+                self.proven[node] = -1
+            else:
+                break
+
+    # node を新しいルートにして、その部分木以外を捨てる
+    def reroot(self, node: int):
+        """
+        node の部分木（合流先も含む）を幅優先順に配列の先頭へ詰め直す
+        （子の連続性は保たれる）。統計と展開済みの子はそのまま引き継ぐ。
+        代表スロットが捨てる側にあった局面は、残る最初のスロットを新しい代表にする。
+        配列の容量は縮めない。
+        """
+        if node == ROOT:
+            return
+
+        # 残すスロット（旧番号）を新しい番号順に並べる
+        order = [node]
+        rep = {}  # 旧代表スロット -> 新しい代表になるスロット（旧番号）
+        i = 0
+        while i < len(order):
+            owner = int(self.link[order[i]])
+            if owner not in rep:
+                rep[owner] = order[i]
+                order.extend(self.children(owner))
+            i += 1
+        order = np.array(order)
+        size = len(order)
+
+        # 旧番号 -> 新番号
+        remap = np.full(self.size, -1, dtype=np.int64)
+        remap[order] = np.arange(size)
+        rep_of = np.full(self.size, -1, dtype=np.int64)
+        rep_of[list(rep)] = list(rep.values())
+
+        owners = self.link[order]
+        is_rep = rep_of[owners] == order
+        for name, fill in _EDGE_FIELDS:
+            arr = getattr(self, name)
+            arr[:size] = arr[order]
+            arr[size : self.size] = fill
+        for name, fill in _NODE_FIELDS:
+            arr = getattr(self, name)
+            arr[:size] = np.where(is_rep, arr[owners], fill)
+            arr[size : self.size] = fill
+        expanded = self.first_child[:size] >= 0
+        self.first_child[:size][expanded] = remap[self.first_child[:size][expanded]]
+        self.parent[1:size] = remap[rep_of[self.parent[1:size]]]
+        self.parent[ROOT] = -1
+        self.action[ROOT] = -1
+        self.link[:size] = remap[rep_of[owners]]
+        self.link[size : self.size] = np.arange(size, self.size)
+        self.states = [self.states[i] for i in order]
+        self.table = {
+            key: int(remap[rep_of[owner]])
+            for key, owner in self.table.items()
+            if rep_of[owner] >= 0
+        }
+        self.size = size
+
+    # ルートから depth 手以内で state と同じ局面のノード（なければ None）
+    def find(self, state: State, depth: int = 2):
+        """State をまだ作っていないノードは一度も選ばれていない（引き継ぐ統計がない）ので見ない"""
+        nodes = [ROOT]
+        for _ in range(depth + 1):
+            for node in nodes:
+                if self.states[node] is not None and self.states[node] == state:
+                    return node
+            nodes = [c for node in nodes for c in self.children(self.link[node])]
+        return None
+
+    def child_proven(self, node: int = ROOT):
+        """子ノードの確定した勝敗のリスト（子の手番側から見て。合法手と同じ順）"""
+        first = self.first_child[self.link[node]]
+        end = first + self.num_children[self.link[node]]
+        return self.proven[self.link[first:end]].tolist()
+
+    def child_visits(self, node: int = ROOT):
+        """子ノードの試行回数のリスト（合法手と同じ順）"""
+        first = self.first_child[self.link[node]]
+        return self.N[first : first + self.num_children[self.link[node]]].tolist()
+
+
+# 代表スロット node から葉まで降りる（Numba 版。select_child と同じ計算を子ごとのループで行う）
+@njit(cache=True)
+def _descend(
+    node, depth, path, first_child, num_children, link, N, V, W, node_N, P, proven, c_puct
+):
+    """
+    path[depth:] に通ったスロットを書き足して新しい長さを返す。
+    未展開・確定済みの局面か、置換表を引いていない未展開のスロットに着いたら止める。
+    """
+    while first_child[node] >= 0 and proven[node] == 0:
+        first = first_child[node]
+        end = first + num_children[node]
+        total = 0
+        for c in range(first, end):
+            total += N[c] + V[c]
+        scale = c_puct * sqrt(total)
+
+        # PUCT が最大の子（同点は先の子）
+        best = first
+        best_score = -inf
+        for c in range(first, end):
+            owner = link[c]
+            v = V[c]
+            if proven[owner] == 1:
+                score = -inf
+            elif proven[owner] == -1:
+                score = inf
+            else:
+                score = (W[owner] - v) / max(node_N[owner] + v, 1) + P[c] * scale / (
+                    1 + N[c] + v
+                )
+            if score > best_score:
+                best = c
+                best_score = score
+
+        V[best] += 1
+        path[depth] = best
+        depth += 1
+        node = link[best]
+        if node == best and first_child[best] < 0:
+            break
+    return depth
+
+
+# 経路の逆伝播（Numba 版。backup と同じ更新を葉からルートへ1回のループで行う）
+@njit(cache=True)
+def _backup(path, depth, value, link, N, V, W, node_N):
+    sign = 1.0
+    for i in range(depth - 1, -1, -1):
+        slot = path[i]
+        owner = link[slot]
+        W[owner] += value * sign
+        node_N[owner] += 1
+        N[slot] += 1
+        if i > 0:
+            V[slot] -= 1
+        sign = -sign
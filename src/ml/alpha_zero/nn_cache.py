@@ -0,0 +1,96 @@
+# NN 推論結果のキャッシュ（LRU）
+#
+# 同じ局面は1回の探索の中でも、1局の中でも、セルフプレイの全ゲームを通しても
+# （毎局 State() から始まるので特に序盤は）何度も評価される。
+# (モデル, 局面の Zobrist ハッシュ) ごとに predict の結果 (policies, value) を覚えておき、
+# 同じモデルで同じ局面を評価するときは推論を省く。
+# NN の入力は盤面と手番だけで決まるので、手数を含まない State.zobrist をキーにする。
+# 使用メモリの上限 (NN_CACHE_MAX_BYTES) を超えたら最も長く使われていないものから捨てる。
+
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from dotenv import load_dotenv
+import itertools
+import sys
+import os
+
+load_dotenv()
+# キャッシュの使用メモリの上限（バイト、0 ならキャッシュしない）
+NN_CACHE_MAX_BYTES = int(os.getenv("NN_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# 1エントリあたりの配列以外の大きさの見積もり（キーのタプル・辞書の枠・value など）
+_ENTRY_OVERHEAD = 200
+
+
+class NNCache:
+    def __init__(self, max_bytes: int = NN_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (モデル番号, zobrist) -> (policies, value, バイト数)
+        # モデルごとの番号（id() は解放後に使い回されるので、モデルが消えたら番号も消える）
+        self._model_ids = WeakKeyDictionary()
+        self._next_id = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, model, state):
+        model_id = self._model_ids.get(model)
+        if model_id is None:
+            model_id = self._model_ids[model] = next(self._next_id)
+        return model_id, state.zobrist
+
+    def get(self, model, state):
+        """キャッシュにあれば (policies, value)、なければ None"""
+        key = self._key(model, state)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, model, state, policies, value):
+        size = sys.getsizeof(policies) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        key = self._key(model, state)
+        # 共有する配列なので書き換えられないようにする
+        policies.flags.writeable = False
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[2]
+        self._entries[key] = (policies, value, size)
+        self.nbytes += size
+        # 上限を超えた分だけ古いものから捨てる
+        while self.nbytes > self.max_bytes:
+            _, (_, _, old_size) = self._entries.popitem(last=False)
+            self.nbytes -= old_size
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """ヒット数・ミス数・ヒット率・エントリ数・使用メモリ"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+        }
+
+
+# プロセス全体で共有するキャッシュ
+_nn_cache = NNCache()
+
+
+def get_nn_cache() -> NNCache:
+    return _nn_cache
@@ -0,0 +1,148 @@
+# 序盤の定跡（オープニングブック）
+#
+# API との対局は毎回同じ初期局面から始まるので、序盤 N 手以内に現れる全局面を
+# あらかじめ深い PV-MCTS で探索し、局面キー (State.key) ごとに
+# 合法手と訪問回数の分布を保存しておく。推論時はブックにある局面なら探索せずに引く。
+#
+# 保存形式（npz）:
+#   keys    : (M,) uint64  局面キー（昇順）
+#   offsets : (M+1,) uint32 keys[i] の手は moves[offsets[i]:offsets[i+1]]
+#   moves   : (T,) uint32  パック形式の手（legal_moves の順）
+#   visits  : (T,) uint16  訪問回数
+#   model   : () str       作成に使ったモデルの重みのハッシュ（model_digest）
+#
+# best.keras が更新されるとブックは古いモデルの手になるので、読み込み時に
+# 推論に使うモデルのハッシュと比べ、一致しなければ使わない（作り直すまで毎回探索する）。
+#
+#   python -m src.ml.alpha_zero.opening_book
+
+from src.ml.checker_state import State
+from src.ml.alpha_zero.pv_mcts import pv_mcts_scores
+from src.infrastructure.aws.s3 import (
+    upload_bytes_to_s3,
+    load_bytes_from_s3,
+    load_model_from_s3,
+)
+
+from keras import backend as K
+import numpy as np
+import hashlib
+import io
+
+# ブックに入れる手数（初期局面から BOOK_PLIES 手未満の局面）
+BOOK_PLIES = 6
+# ブック作成時の1局面あたりのシミュレーション回数
+BOOK_EVALUATE_COUNT = 1600
+# S3 上の保存先
+BOOK_DIR_NAME = "opening_book"
+BOOK_FILE_NAME = "opening_book.npz"
+
+
+# モデルの識別子（重みのハッシュ）
+def model_digest(model) -> str:
+    h = hashlib.sha256()
+    for weights in model.get_weights():
+        h.update(np.ascontiguousarray(weights).tobytes())
+    return h.hexdigest()
+
+
+# 序盤の局面の列挙
+def book_positions(plies: int = BOOK_PLIES):
+    """初期局面から plies 手未満で到達する局面（State.key で重複を除く）"""
+    positions = {}
+    frontier = [State()]
+    for _ in range(plies):
+        next_frontier = []
+        for state in frontier:
+            if state.key in positions or state.is_done():
+                continue
+            positions[state.key] = state
+            next_frontier.extend(state.next(move) for move in state.legal_moves())
+        frontier = next_frontier
+    return list(positions.values())
+
+
+# ブックの作成
+def build_book(model, plies: int = BOOK_PLIES, evaluate_count: int = BOOK_EVALUATE_COUNT):
+    """各局面を探索して npz のバイト列を返す"""
+    positions = book_positions(plies)
+    entries = []
+    for i, state in enumerate(positions):
+        # 温度 1 なら訪問回数に比例した分布になる
+        scores = pv_mcts_scores(state, model, 1.0, evaluate_count=evaluate_count)
+        visits = np.rint(np.array(scores) * evaluate_count).astype(np.uint16)
+        entries.append((state.key, state.legal_moves(), visits))
+        print(f"\rOpening Book {i+1}/{len(positions)}", end="")
+    print("")
+
+    entries.sort(key=lambda e: e[0])
+    offsets = np.cumsum([0] + [len(e[1]) for e in entries]).astype(np.uint32)
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        keys=np.array([e[0] for e in entries], dtype=np.uint64),
+        offsets=offsets,
+        moves=np.array([m for e in entries for m in e[1]], dtype=np.uint32),
+        visits=np.concatenate([e[2] for e in entries]),
+        model=np.array(model_digest(model)),
+    )
+    return buf.getvalue()
+
+
+class OpeningBook:
+    def __init__(self, body: bytes):
+        data = np.load(io.BytesIO(body))
+        self.keys = data["keys"]
+        self.offsets = data["offsets"]
+        self.moves = data["moves"]
+        self.visits = data["visits"]
+        # 作成に使ったモデルのハッシュ（記録前に作ったブックは None）
+        self.model = str(data["model"]) if "model" in data.files else None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, state: State):
+        """
+        ブックにある局面なら (合法手のリスト, 訪問回数の配列) を返す。ない場合は None。
+        """
+        key = np.uint64(state.key)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.moves[start:end].tolist(), self.visits[start:end]
+
+    def best_move(self, state: State):
+        """訪問回数が最大の手（ブックにない局面は None）"""
+        hit = self.lookup(state)
+        if hit is None:
+            return None
+        moves, visits = hit
+        return moves[int(np.argmax(visits))]
+
+
+def load_opening_book(model=None):
+    """
+    S3 からブックを読み込む（まだ作られていなければ None）
+    model: 推論に使うモデル。別のモデルで作ったブックは警告を出して None を返す
+    """
+    body = load_bytes_from_s3(BOOK_DIR_NAME, BOOK_FILE_NAME)
+    if not body:
+        return None
+    book = OpeningBook(body)
+    if model is not None and book.model != model_digest(model):
+        print("警告: 定跡が現在のモデルで作られていないため使いません（作り直してください）")
+        return None
+    return book
+
+
+if __name__ == "__main__":
+    model = load_model_from_s3("saved_models", "best.keras")
+    body = build_book(model)
+    upload_bytes_to_s3(BOOK_DIR_NAME, BOOK_FILE_NAME, body)
+
+    K.clear_session()
+    del model
+
+# python -m src.ml.alpha_zero.opening_book
@@ -1,12 +1,19 @@
 # ポリシー・バリュー付きモンテカルロ木探索（PV-MCTS）
 from src.ml.checker_state import State
-from src.ml.alpha_zero.dual_network import DN_INPUT_SHAPE, action_to_index
+from src.ml.move import move_indices
+from src.ml.tablebase import get_tablebase
+from src.ml.alpha_zero.dual_network import DN_INPUT_SHAPE
+from src.ml.alpha_zero.mcts_tree import MCTSTree, ROOT
+from src.ml.alpha_zero.nn_cache import get_nn_cache
+from src.ml.alpha_zero.encoder import encode_states
 from src.ml.gameplay import play
 from src.infrastructure.aws.s3 import load_model_from_s3
 
-from math import sqrt
 from pathlib import Path
 import numpy as np
+import threading
+import queue
+import time
 from keras.models import load_model
 from dotenv import load_dotenv
 import os
@@ -17,6 +24,12 @@ MODEL_DIR_PATH = os.getenv("MODEL_DIR_PATH")
 
 # 1推論あたりのシミュレーション回数
 PV_EVALUATE_COUNT = 100
+# 1回の NN 推論でまとめて評価する葉の数（1 なら葉ごとに推論）
+PV_BATCH_SIZE = 8
+# 木を共有して探索するスレッド数（1 なら推論スレッドを使わずに1スレッドで探索）
+PV_THREADS = 1
+# 温度 0 の探索を打ち切ってよい最小のシミュレーション回数
+PV_MIN_SIMULATIONS = 0
 
 # 盤面サイズは DN_INPUT_SHAPE から取得
 H, W, C = DN_INPUT_SHAPE
@@ -28,38 +41,9 @@ BOARD_SIZE = H
 def state_to_tensor(state: State):
     """
     State(盤面オブジェクト)を、モデルに入力できる (1, 6, 6, 4) テンソルに変換する。
-    チャンネル定義:
-      0: 手番側の通常駒
-      1: 手番側のキング
-      2: 相手側の通常駒
-      3: 相手側のキング
+    チャンネル定義は encoder.py を参照。
     """
-    planes = np.zeros(DN_INPUT_SHAPE, dtype=np.float32)
-
-    # state.turn を「自分」として正規化（RED=1, BLUE=-1を想定）
-    my_color = 1 if state.turn == 1 else -1
-
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            v = state.board[r][c]
-            if v == 0:
-                continue
-            color = 1 if v > 0 else -1
-            is_king = abs(v) == 2
-
-            if color == my_color:
-                if not is_king:
-                    planes[r, c, 0] = 1  # 自分ノーマル
-                else:
-                    planes[r, c, 1] = 1  # 自分キング
-            else:
-                if not is_king:
-                    planes[r, c, 2] = 1  # 相手ノーマル
-                else:
-                    planes[r, c, 3] = 1  # 相手キング
-
-    # バッチ次元を足して (1, H, W, 4)
-    return planes[np.newaxis, ...]
+    return encode_states([state])
 
 
 # NN 推論
@@ -69,46 +53,52 @@ def predict(model, state: State):
     policies: 合法手に対応する確率の np.ndarray
     value   : 現局面の状態価値（手番側から見た -1〜1）
     """
-    # 入力テンソルに変換
-    x = state_to_tensor(state)
-
-    # 推論
-    pi_full, v = model.predict(
-        x, batch_size=1, verbose=0
-    )  # pi_full.shape=(1, ACTION_SIZE)
+    return predict_batch(model, [state])[0]
 
-    # 合法手を取得
-    legal_actions = state.legal_actions()  # [(fr,fc,tr,tc, captured_list), ...]
 
-    # 各合法手をポリシーベクトル上の index に変換
-    indices = [
-        action_to_index(fr, fc, tr, tc) for (fr, fc, tr, tc, captured) in legal_actions
-    ]
+# NN 推論（複数局面をまとめて1回で推論）
+def predict_batch(model, states):
+    """
+    states の各局面について predict と同じ (policies, value) のリストを返す。
+    model.predict は呼び出しごとのオーバーヘッドが大きいので、まとめて1回だけ呼ぶ。
+    同じモデルで評価済みの局面は NN キャッシュ (nn_cache.py) から返し、推論しない。
+    """
+    cache = get_nn_cache()
+    results = [cache.get(model, state) for state in states]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if not misses:
+        return results
 
-    # 合法手に対応するポリシーのみ抽出
-    policies = pi_full[0][indices]  # shape=(len(legal_actions),)
+    # 入力テンソルに変換 (N, 6, 6, 4)
+    x = encode_states([states[i] for i in misses])
 
-    # 合計1に正規化（全部0なら一様分布）
-    s = policies.sum()
-    if s > 0:
-        policies = policies / s
-    else:
-        policies = np.ones_like(policies) / len(policies)
+    # 推論
+    pi_full, v = model.predict(
+        x, batch_size=len(misses), verbose=0
+    )  # pi_full.shape=(N, ACTION_SIZE)
 
-    # バリュー（手番側から見た価値）
-    value = v[0][0]
+    for j, i in enumerate(misses):
+        state = states[i]
 
-    return policies, value
+        # 合法手（パック形式）をポリシーベクトル上の index に変換
+        indices = move_indices(state.legal_moves())
 
+        # 合法手に対応するポリシーのみ抽出
+        policies = pi_full[j][indices]  # shape=(len(legal_moves),)
 
-def nodes_to_scores(nodes):
-    """ノードのリストを試行回数 n のリストに変換"""
-    return [c.n for c in nodes]
+        # 合計1に正規化（全部0なら一様分布）
+        s = policies.sum()
+        if s > 0:
+            policies = policies / s
+        else:
+            policies = np.ones_like(policies) / len(policies)
 
+        # バリュー（手番側から見た価値）
+        value = v[j][0]
+        cache.put(model, state, policies, value)
+        results[i] = (policies, value)
 
-def argmax(collection: list, key=None):
-    """最大値のインデックスを返す（keyは未使用で3目並べに合わせた形だけ残す）"""
-    return collection.index(max(collection))
+    return results
 
 
 def boltzman(xs, temperature):
@@ -118,99 +108,417 @@ def boltzman(xs, temperature):
     return [x / s for x in xs]
 
 
+# プロセス全体の探索の統計（PVMCTSSearch を捨てても残る。search_stats を参照）
+_search_totals = {"simulations": 0, "saved_simulations": 0}
+_search_totals_lock = threading.Lock()
+
+
+def search_stats():
+    """実行したシミュレーション回数・温度 0 の打ち切りで省いた回数・省いた割合（累計）"""
+    with _search_totals_lock:
+        simulations = _search_totals["simulations"]
+        saved = _search_totals["saved_simulations"]
+    total = simulations + saved
+    return {
+        "simulations": simulations,
+        "saved_simulations": saved,
+        "saved_rate": saved / total if total else 0.0,
+    }
+
+
 # PV-MCTS 本体
-def pv_mcts_scores(state: State, model, temperature):
-    # ノードの定義
-    class Node:
-        def __init__(self, state: State, p):
-            self.state = state  # ゲームの状態
-            self.p = p  # ポリシー（事前確率）
-            self.w = 0  # 累計価値
-            self.n = 0  # 試行回数
-            self.child_nodes = None  # 子ノードのリスト
-
-        # 局面の価値の計算
-        def evaluate(self):
-            # ゲーム終了時
-            if self.state.is_done():
-                # 勝敗結果の価値（手番側から見て）
-                value = -1 if self.state.is_lose() else 0
-
-                # 累計価値と試行回数の更新
-                self.w += value
-                self.n += 1
-                return value
-
-            # 子ノードが存在しない時（展開）
-            if not self.child_nodes:
-                # ニューラルネットワークでポリシーとバリューを取得
-                policies, value = predict(model, self.state)
-
-                # 累計価値と試行回数の更新
-                self.w += value
-                self.n += 1
-
-                # ノードの展開
-                self.child_nodes = []
-                for action, policy in zip(self.state.legal_actions(), policies):
-                    next_state = self.state.next(action)
-                    self.child_nodes.append(Node(next_state, policy))
-                return value
-
-            # 子ノードが存在する時（UCBで次に進む）
-            else:
-                # アーク評価値が最大の子ノードの評価で価値を取得
-                value = -self.next_child_node().evaluate()
-                # 累計価値と試行回数の更新
-                self.w += value
-                self.n += 1
-                return value
-
-        # アーク評価値が最大の子ノードの取得
-        def next_child_node(self):
-            # アーク評価値の計算
-            C_PUCT = 1.0
-            t = sum(nodes_to_scores(self.child_nodes))
-            pucb_values = []
-            for child_node in self.child_nodes:
-                q = child_node.w / child_node.n if child_node.n else 0
-                u = C_PUCT * child_node.p * sqrt(t) / (1 + child_node.n)
-                pucb_values.append(q + u)
-            # アーク評価値が最大の子ノードを返す
-            return self.child_nodes[argmax(pucb_values)]
-
-    # 現在の局面のノード作成
-    root_node = Node(state, 0)
-
-    # 複数回の評価を実行
-    for _ in range(PV_EVALUATE_COUNT):
-        root_node.evaluate()
-
-    # 合法手の確率分布（rootの子ノードの訪問回数に基づく）
-    scores = nodes_to_scores(root_node.child_nodes)
-    if temperature == 0:  # 最大値のみ1
-        action_idx = int(np.argmax(scores))
-        scores = [0] * len(scores)
-        scores[action_idx] = 1
-    else:  # ボルツマン分布によるスコア付け
-        scores = boltzman(scores, temperature)
-
-    return scores
+def pv_mcts_scores(
+    state: State,
+    model,
+    temperature,
+    evaluate_count=PV_EVALUATE_COUNT,
+    batch_size=PV_BATCH_SIZE,
+    deadline=None,
+    threads=PV_THREADS,
+):
+    """
+    evaluate_count 回のシミュレーションを行い、合法手ごとのスコアを返す。
+    deadline（time.monotonic() の時刻）を渡すと、その時刻を過ぎた時点の
+    訪問回数で打ち切る（evaluate_count=None なら時刻まで探索し続ける）。
+    threads > 1 なら複数スレッドで同じ木を探索する（PVMCTSSearch._simulate_parallel）。
+    毎回新しい木で探索する（手をまたいで木を使い回すなら PVMCTSSearch を使う）。
+    実行・省略したシミュレーション回数は search_stats() の累計に入る。
+    """
+    return PVMCTSSearch(model, evaluate_count, batch_size, threads).scores(
+        state, temperature, deadline
+    )
+
+
+# 手をまたいで探索木を使い回す PV-MCTS
+class PVMCTSSearch:
+    """
+    scores(state) のたびに、前回の木のルートから2手以内（自分の手・相手の手）に
+    state があればそこを新しいルートにして部分木の訪問回数を引き継ぎ、
+    残りは捨てる。見つからなければ新しい木を作る。
+    1局の間は同じオブジェクトを使い、局面は順に渡すこと。
+    """
+
+    def __init__(
+        self,
+        model,
+        evaluate_count=PV_EVALUATE_COUNT,
+        batch_size=PV_BATCH_SIZE,
+        threads=PV_THREADS,
+        min_simulations=PV_MIN_SIMULATIONS,
+    ):
+        self.model = model
+        self.evaluate_count = evaluate_count
+        self.batch_size = batch_size
+        self.threads = threads
+        self.min_simulations = min_simulations
+        self.tree = None
+        self.simulations = 0  # 実行したシミュレーション回数の累計
+        self.saved_simulations = 0  # 打ち切りで省いたシミュレーション回数の累計
+
+    # 木を捨てる（新しい対局の前など）
+    def reset(self):
+        self.tree = None
+
+    # state をルートにする（前回の木に state があれば部分木を引き継ぐ）
+    def advance(self, state: State):
+        node = None if self.tree is None else self.tree.find(state)
+        if node is None:
+            self.tree = MCTSTree(state)
+        else:
+            self.tree.reroot(node)
+            # データベースの葉として勝敗が確定した局面は子がないので、ルートにするなら探索し直す
+            if not self.tree.is_expanded(ROOT):
+                self.tree.proven[ROOT] = 0
+
+    # 合法手ごとのスコア（legal_moves と同じ順）
+    def scores(self, state: State, temperature, deadline=None):
+        """
+        deadline: 探索を打ち切る time.monotonic() の時刻（None なら回数だけで止める）
+        temperature == 0 のときは、残りの回数で訪問回数最大の子が変わらなくなった
+        時点で打ち切る（min_simulations 回までは続ける。選ぶ手は、残りの回数で新たに
+        勝敗が確定しない限り打ち切らない場合と同じ）。
+        """
+        self.advance(state)
+        self._simulate(self.evaluate_count, deadline, early_stop=temperature == 0)
+
+        # 勝ちが確定した局面は、温度 0 なら相手の負けが確定する手だけを選ぶ
+        # （温度 > 0 では学習データになる訪問回数の分布をそのまま使う）
+        if temperature == 0 and self.tree.proven[ROOT] == 1:
+            scores = [0] * len(state.legal_moves())
+            scores[self.tree.child_proven(ROOT).index(-1)] = 1
+            return scores
+
+        # 合法手の確率分布（rootの子ノードの訪問回数に基づく）
+        scores = self.tree.child_visits(ROOT)
+        # 負けが確定していない手があれば、負けが確定した手（子の手番側の勝ち）は選ばない
+        # （確定する前に訪問回数が溜まっていることがある）
+        lost = [proven == 1 for proven in self.tree.child_proven(ROOT)]
+        if all(lost):
+            lost = [False] * len(lost)
+        if not any(n for n, is_lost in zip(scores, lost) if not is_lost):  # 訪問がない場合
+            scores = [1] * len(scores)
+        scores = [0 if is_lost else n for n, is_lost in zip(scores, lost)]
+        if temperature == 0:  # 最大値のみ1
+            action_idx = int(np.argmax(scores))
+            scores = [0] * len(scores)
+            scores[action_idx] = 1
+        else:  # ボルツマン分布によるスコア付け
+            scores = boltzman(scores, temperature)
+
+        return scores
+
+    # evaluate_count 回のシミュレーション
+    def _simulate(self, evaluate_count, deadline=None, early_stop=False):
+        if evaluate_count is None:
+            assert deadline is not None, "evaluate_count か deadline のどちらかが必要です"
+            evaluate_count = float("inf")
+        # 終盤データベース（なければ None）
+        tablebase = get_tablebase()
+        saved = self.saved_simulations
+        if self.threads > 1:
+            count = self._simulate_parallel(evaluate_count, deadline, early_stop, tablebase)
+        else:
+            count = self._simulate_serial(evaluate_count, deadline, early_stop, tablebase)
+        self.simulations += count
+        with _search_totals_lock:
+            _search_totals["simulations"] += count
+            _search_totals["saved_simulations"] += self.saved_simulations - saved
+
+    # 最善手が決まったか
+    def _decided(self, count, evaluate_count, early_stop):
+        """
+        ルートの勝敗が確定したら常に打ち切る。
+        early_stop なら、残り回数をどの子に足しても訪問回数最大の子が変わらないときも打ち切る。
+        評価待ちの試行（仮想損失）はどの子に入るか分からないので、その子の分として数える。
+        scores() と同じく、負けが確定した子（子の手番側の勝ち）は最大の候補から除き、
+        相手の負けが確定した子があれば打ち切らない（その手が選ばれるため）。
+        """
+        tree = self.tree
+        remaining = evaluate_count - count
+        if not tree.proven[ROOT]:
+            if not early_stop or count < self.min_simulations or not tree.is_expanded(ROOT):
+                return False
+            first = int(tree.first_child[ROOT])
+            end = first + int(tree.num_children[ROOT])
+            proven = tree.proven[tree.link[first:end]]
+            if (proven == -1).any():
+                return False
+            n = np.where(proven == 1, -1, tree.N[first:end])
+            best = int(n.argmax())
+            others = np.where(proven == 1, 0, n + tree.V[first:end])
+            others[best] = 0
+            # 合法手が1つなら探索するまでもない
+            if end - first > 1 and n[best] <= others.max() + remaining:
+                return False
+        if remaining != float("inf"):
+            self.saved_simulations += remaining
+        return True
+
+    # 推論せずに価値が決まる局面なら、その価値（手番側から見て）
+    def _terminal_value(self, node, tablebase):
+        # 勝敗が確定済み（手順違いで別の経路から確定した局面）
+        if self.tree.proven[node]:
+            return int(self.tree.proven[node])
+        node_state = self.tree.state(node)
+        # ゲーム終了時
+        if node_state.is_done():
+            # 勝敗結果の価値
+            return -1 if node_state.is_lose() else 0
+        # 終盤データベースで結果が確定している局面（ルート以外）は真の値を使う
+        if tablebase is not None and node != ROOT:
+            return tablebase.value(node_state)
+        return None
+
+    # 時間切れ（ルートを展開して、子を1回以上訪問したあとだけ）
+    def _timed_out(self, deadline):
+        """
+        ルートの試行回数では判定しない（木を引き継いだルートは、データベースの葉として
+        展開されないまま訪問されていることがある）。
+        """
+        if deadline is None or time.monotonic() < deadline:
+            return False
+        tree = self.tree
+        if not tree.is_expanded(ROOT):
+            return False
+        first = tree.first_child[ROOT]
+        return bool(tree.N[first : first + tree.num_children[ROOT]].any())
+
+    # 葉を最大 batch_size 個選ぶ（_simulate_serial / _simulate_parallel で共通）
+    def _collect_leaves(self, buffer, remaining, evaluating, deadline, tablebase):
+        """
+        buffer: 経路を書き込む作業用の配列（探索スレッドごとに1つ）
+        remaining: このバッチで開始してよいシミュレーションの残り回数
+        evaluating: 推論中の葉（他のスレッドのバッチ。1スレッドなら空）
+        終局・データベースで価値が決まる葉（勝敗が確定した局面も含む）は、
+        buffer の経路のままその場で逆伝播する。推論を待つ葉の経路だけコピーして残す。
+        推論待ちの葉（このバッチ・evaluating。合流先も含む）を選び直したら、
+        その経路の仮想損失を外してバッチを終える。
+        (推論する (経路, 葉) のリスト, その場で逆伝播した回数, 止まった葉 or None) を返す。
+        """
+        tree = self.tree
+        pending = []  # (経路, 葉) 推論待ち
+        pending_leaves = set()
+        terminal = 0
+        while terminal + len(pending) < remaining and len(pending) < self.batch_size:
+            depth, leaf = tree.select_leaf(buffer)
+
+            # 終局・データベースで価値が決まる葉はその場で逆伝播
+            value = self._terminal_value(leaf, tablebase)
+            if value is not None:
+                tree.backup(buffer, depth, value)
+                tree.prove(buffer, depth, value)
+                terminal += 1
+                if self._timed_out(deadline) or tree.proven[ROOT]:
+                    break
+                continue
+
+            # 推論待ちの葉を選び直した → 今回のバッチはここまで
+            if leaf in pending_leaves or leaf in evaluating:
+                tree.V[buffer[1:depth]] -= 1
+                return pending, terminal, leaf
+            pending.append((buffer[:depth].copy(), leaf))
+            pending_leaves.add(leaf)
+        return pending, terminal, None
+
+    # 推論した葉を展開して逆伝播
+    def _expand_leaves(self, pending, results):
+        for (path, leaf), (policies, value) in zip(pending, results):
+            self.tree.expand(leaf, policies)
+            self.tree.backup(path, len(path), value)
+
+    # シミュレーション（1スレッド）
+    def _simulate_serial(self, evaluate_count, deadline, early_stop, tablebase):
+        """
+        batch_size 個の葉を仮想損失 (virtual loss) で散らしながら選び、
+        まとめて1回の推論で評価してから全て逆伝播する（batch_size=1 なら1つずつ）。
+        deadline を過ぎたらバッチの区切りで打ち切る（ルートの子が1回も
+        訪問されていなければ、スコアを作れるところまでは続ける）。
+        ルートの勝敗が確定した時点、early_stop なら最善手が決まった時点でも打ち切る。
+        実行した回数を返す。
+        """
+        tree = self.tree
+        buffer = np.empty(tree.max_path_length(), dtype=np.int64)
+
+        # 複数回の評価を実行
+        count = 0
+        while count < evaluate_count and not self._timed_out(deadline):
+            if self._decided(count, evaluate_count, early_stop):
+                break
+            # 1. 葉を最大 batch_size 個選ぶ
+            pending, terminal, _ = self._collect_leaves(
+                buffer, evaluate_count - count, (), deadline, tablebase
+            )
+            count += terminal
+
+            # 2. 選んだ葉をまとめて推論し、展開して逆伝播
+            if pending:
+                results = predict_batch(
+                    self.model, [tree.state(leaf) for _, leaf in pending]
+                )
+                self._expand_leaves(pending, results)
+                count += len(pending)
+
+        return count
+
+    # シミュレーション（木を共有する複数スレッド）
+    def _simulate_parallel(self, evaluate_count, deadline, early_stop, tablebase):
+        """
+        threads 本の探索スレッドが同じ木を仮想損失で散らしながら降りて、
+        それぞれ最大 batch_size 個の葉を推論キューに積む。
+        推論スレッドはキューにたまった葉をまとめて1回で推論し、各探索スレッドは
+        結果を受け取ってから展開・逆伝播する。あるスレッドの葉を推論している間に
+        他のスレッドが次の葉を選ぶので、木の処理と推論が重なる。
+        木の読み書きは lock の中だけで行う。実行した回数を返す。
+        """
+        tree = self.tree
+        lock = threading.Lock()
+        requests = queue.Queue()  # (局面のリスト, 返信用キュー) 推論待ち。None で終了
+        evaluating = {}  # 推論中の葉 -> 展開が終わったら set される Event
+        started = 0  # 開始したシミュレーション数（lock の中で更新）
+        decided = False  # 最善手が決まって打ち切った
+        failed = threading.Event()
+        errors = []
+
+        # 推論スレッド（たまっている要求をまとめて1回で推論する）
+        def infer():
+            while True:
+                item = requests.get()
+                if item is None:
+                    return
+                batch = [item]
+                while True:
+                    try:
+                        item = requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        # 終了の合図は今のバッチを返してから受け取る
+                        requests.put(None)
+                        break
+                    batch.append(item)
+                try:
+                    results = predict_batch(
+                        self.model, [state for states, _ in batch for state in states]
+                    )
+                except Exception as e:
+                    for _, reply in batch:
+                        reply.put(e)
+                    continue
+                i = 0
+                for states, reply in batch:
+                    reply.put(results[i : i + len(states)])
+                    i += len(states)
+
+        # 探索スレッド
+        def work():
+            nonlocal started, decided
+            reply = queue.Queue(maxsize=1)
+            buffer = np.empty(tree.max_path_length(), dtype=np.int64)
+            try:
+                while not failed.is_set():
+                    # 1. 葉を最大 batch_size 個選ぶ
+                    done = threading.Event()  # このバッチの展開が終わったら set
+                    wait = None
+                    with lock:
+                        if started >= evaluate_count or self._timed_out(deadline):
+                            return
+                        # 推論中の試行は仮想損失として _decided で数える
+                        if decided or self._decided(started, evaluate_count, early_stop):
+                            decided = True
+                            return
+                        pending, terminal, blocked = self._collect_leaves(
+                            buffer, evaluate_count - started, evaluating, deadline, tablebase
+                        )
+                        started += terminal + len(pending)
+                        for _, leaf in pending:
+                            evaluating[leaf] = done
+                        # 他のスレッドが推論中の葉で止まった → その展開を待つ
+                        if blocked is not None and not pending:
+                            wait = evaluating[blocked]
+                        states = [tree.state(leaf) for _, leaf in pending]
+
+                    # 他のスレッドの葉の展開を待ってからやり直す
+                    if wait is not None:
+                        wait.wait()
+                        continue
+                    if not pending:
+                        continue
+
+                    # 2. 推論はロックの外で待つ
+                    requests.put((states, reply))
+                    results = reply.get()
+                    if isinstance(results, Exception):
+                        raise results
+
+                    # 3. 展開して逆伝播
+                    with lock:
+                        self._expand_leaves(pending, results)
+                        for _, leaf in pending:
+                            del evaluating[leaf]
+                        done.set()
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+                # 待っているスレッドを起こして終わらせる
+                with lock:
+                    for event in evaluating.values():
+                        event.set()
+
+        inference = threading.Thread(target=infer, daemon=True)
+        inference.start()
+        workers = [threading.Thread(target=work, daemon=True) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        requests.put(None)
+        inference.join()
+        if errors:
+            raise errors[0]
+        return started
 
 
 # モンテカルロ木探索で行動選択
 def pv_mcts_action(model, temperature=0.0):
+    """
+    返す関数の search 属性が探索オブジェクト
+    （search.simulations / search.saved_simulations で探索回数を見られる）
+    """
+    # 探索木は手をまたいで使い回す（相手の手も含めて2手先まで引き継ぐ）
+    search = PVMCTSSearch(model)
+
     def _pv_mcts_action(state: State):
         # 合法手と、そのスコアを取得
-        legal_actions = state.legal_actions()
-        scores = pv_mcts_scores(state, model, temperature)
+        legal_moves = state.legal_moves()
+        scores = search.scores(state, temperature)
 
         # インデックスを確率付きでサンプリング
-        idx = np.random.choice(len(legal_actions), p=scores)
+        idx = np.random.choice(len(legal_moves), p=scores)
 
-        # 対応する行動（(fr,fc,tr,tc,captured_list)）を返す
-        return legal_actions[idx]
+        # 対応する行動（パック形式の手。State.next にそのまま渡せる）を返す
+        return legal_moves[idx]
 
+    _pv_mcts_action.search = search
     return _pv_mcts_action
 
 
@@ -1,11 +1,11 @@
 # セルフプレイによる学習データ生成（強化学習）
 
 from src.ml.checker_state import State
-from src.ml.alpha_zero.dual_network import (
-    DN_OUTPUT_SIZE,
-    action_to_index,
-)
-from src.ml.alpha_zero.pv_mcts import pv_mcts_scores
+from src.ml.move import move_index
+from src.ml.alpha_zero.dual_network import DN_OUTPUT_SIZE
+from src.ml.alpha_zero.pv_mcts import PVMCTSSearch, search_stats
+from src.ml.alpha_zero.nn_cache import get_nn_cache
+from src.ml.tablebase import get_tablebase
 from src.infrastructure.aws.s3 import upload_bytes_to_s3, load_model_from_s3
 
 from keras.models import load_model
@@ -14,6 +14,7 @@ from datetime import datetime
 from dotenv import load_dotenv
 import numpy as np
 import pickle
+import time
 import os
 
 load_dotenv()
@@ -24,6 +25,10 @@ DATA_DIR_PATH = os.getenv("DATA_DIR_PATH")
 SP_GAME_COUNT = 1000
 # 行動選択の温度パラメータ
 SP_TEMPERATURE = 1.0
+# 1手あたりの探索時間の上限（秒、None なら PV_EVALUATE_COUNT 回で止める）
+SP_TIME_LIMIT = None
+# 木を共有して探索するスレッド数（pv_mcts.PV_THREADS を参照）
+SP_THREADS = 1
 
 
 # 先手プレイヤーの価値
@@ -71,42 +76,59 @@ def play(model):
     # 状態の生成
     state = State()
 
+    # 探索木は1局の間使い回す（指した手の部分木を次の手番に引き継ぐ）
+    search = PVMCTSSearch(model, threads=SP_THREADS)
+
+    # 終盤データベース（なければ None）
+    tablebase = get_tablebase()
+    exact = None
+
     # ゲーム終了まで繰り返す
     while True:
         # ゲーム終了時
         if state.is_done():
             break
 
-        # 合法手の確率分布の取得 (legal_actions と同じ順序)
-        scores = pv_mcts_scores(state, model, SP_TEMPERATURE)
-        legal_actions = state.legal_actions()  # [(fr,fc,tr,tc,captured_list), ...]
+        # 終盤データベースで結果が確定したら、探索せずにその結果で打ち切る
+        if tablebase is not None:
+            exact = tablebase.value(state)
+            if exact is not None:
+                break
+
+        # 合法手の確率分布の取得 (legal_moves と同じ順序)
+        deadline = None if SP_TIME_LIMIT is None else time.monotonic() + SP_TIME_LIMIT
+        scores = search.scores(state, SP_TEMPERATURE, deadline)
+        legal_moves = state.legal_moves()  # パック形式の手のリスト
 
         # ポリシーベクトル（全行動空間分 = DN_OUTPUT_SIZE）を0で初期化
         policies = [0.0] * DN_OUTPUT_SIZE
 
         # 合法手それぞれに対応する index を立てる
-        for (fr, fc, tr, tc, captured), policy in zip(legal_actions, scores):
-            idx = action_to_index(fr, fc, tr, tc)
-            policies[idx] = policy
+        for move, policy in zip(legal_moves, scores):
+            policies[move_index(move)] = policy
 
         # 盤面のコピーを保存（後で State を再構成してもいいし、そのまま平面にしてもいい）
-        board_copy = [row[:] for row in state.board]
+        # state.board はビットボードから毎回新しい2次元リストを作って返す
+        board_copy = state.board
         turn_copy = state.turn
 
         # 学習データに [state_info, policies, value(None)] を追加
         history.append([[board_copy, turn_copy], policies, None])
 
         # 行動の取得
-        # np.random.choice(legal_actions, p=...) はエラーになるので、
         # インデックスをサンプリングしてから実際の行動を取る
-        action_idx = np.random.choice(len(legal_actions), p=scores)
-        action = legal_actions[action_idx]
+        action_idx = np.random.choice(len(legal_moves), p=scores)
+        move = legal_moves[action_idx]
 
         # 次の状態の取得
-        state = state.next(action)
+        state = state.next(move)
 
     # 学習データに価値を追加
-    value = first_player_value(state)
+    if exact is None:
+        value = first_player_value(state)
+    else:
+        # exact は手番側から見た値なので先手視点に直す
+        value = exact if state.is_first_player() else -exact
     for i in range(len(history)):
         history[i][2] = value
         value = -value  # 手番が交代するごとに価値を反転（先手視点での価値）
@@ -134,6 +156,19 @@ def selfplay():
         print(f"\rSelf Play {i+1}/{SP_GAME_COUNT}", end="")
     print("")
 
+    # NN キャッシュの効き具合
+    stats = get_nn_cache().stats()
+    print(
+        f"NN cache: hits {stats['hits']} / misses {stats['misses']} "
+        f"({stats['hit_rate']:.1%}), {stats['entries']} entries, {stats['bytes']} bytes"
+    )
+    # 探索の打ち切りで省いたシミュレーション回数
+    stats = search_stats()
+    print(
+        f"PV-MCTS: {stats['simulations']} simulations, "
+        f"saved {stats['saved_simulations']} ({stats['saved_rate']:.1%})"
+    )
+
     # 学習データの保存
     write_data(history)
 
@@ -1,6 +1,7 @@
 # 学習データによるニューラルネットワークの訓練・更新
 
 from src.ml.alpha_zero.dual_network import DN_INPUT_SHAPE
+from src.ml.alpha_zero.encoder import encode_boards, NUM_PLANES
 from src.infrastructure.aws.s3 import (
     upload_model_to_s3,
     load_model_from_s3,
@@ -39,43 +40,12 @@ def encode_board_to_tensor(boards, turns):
     self_play で保存した
       state_info = [board_copy, turn_copy]
     から、(N, H, W, 4) のテンソルを作る。
-
-    チャンネル定義:
-      0: 手番側の通常駒
-      1: 手番側のキング
-      2: 相手側の通常駒
-      3: 相手側のキング
+    チャンネル定義は探索と同じ (encoder.py を参照)。
     """
-    h, w, c = DN_INPUT_SHAPE
-    assert c == 4, "DN_INPUT_SHAPE のチャンネル数は 4 を想定しています"
-
-    N = len(boards)
-    xs = np.zeros((N, h, w, c), dtype=np.float32)
-
-    for i, (board, turn) in enumerate(zip(boards, turns)):
-        # turn > 0 を「自分」、turn < 0 を「相手」とする
-        my_color = 1 if turn > 0 else -1
-
-        for r in range(h):
-            for col in range(w):
-                v = board[r][col]
-                if v == 0:
-                    continue
-                color = 1 if v > 0 else -1
-                is_king = abs(v) == 2
-
-                if color == my_color:
-                    if not is_king:
-                        xs[i, r, col, 0] = 1.0  # 自分ノーマル
-                    else:
-                        xs[i, r, col, 1] = 1.0  # 自分キング
-                else:
-                    if not is_king:
-                        xs[i, r, col, 2] = 1.0  # 相手ノーマル
-                    else:
-                        xs[i, r, col, 3] = 1.0  # 相手キング
-
-    return xs
+    _, _, c = DN_INPUT_SHAPE
+    assert c == NUM_PLANES, "DN_INPUT_SHAPE のチャンネル数は 4 を想定しています"
+
+    return encode_boards(boards, turns)
 
 
 # デュアルネットワークの学習
@@ -0,0 +1,183 @@
+# 複数盤面の合法手を NumPy でまとめて生成する
+#
+# セルフプレイの並列対局・評価対局・バッチ推論では、数百局面の合法手を同時に必要とする。
+# State.legal_moves() は1局面ずつ Python で処理するので、ここでは
+# (N, 6, 6) の盤面配列を 黒マス 18 マス × 4 方向 のテーブル参照で一括処理する。
+# 多段ジャンプは「探索途中のジャンプ」の配列（フロンティア）を1段ずつ伸ばしていく。
+# 結果は State.legal_actions() と完全に一致する（取った駒の順番・重複の扱いも同じ）。
+
+from src.ml.bitboard import (
+    BOARD_SIZE,
+    RED,
+    BLUE,
+    SQUARES,
+    NUM_SQUARES,
+    DIRECTIONS,
+    KIND_DIRS,
+    MAN_KIND,
+    PROMOTION_MASK,
+)
+from src.ml.move import NUM_CELLS
+
+import numpy as np
+
+ACTION_SIZE = NUM_CELLS * NUM_CELLS  # 1296
+
+# 盤外を表す番兵のマス番号（配列の最後に「駒なし・空きでもない」列を足して参照する）
+OFF = NUM_SQUARES
+
+# 黒マス番号 -> 6x6 を平らにしたときの index
+CELL_OF_SQUARE = np.array([r * BOARD_SIZE + c for r, c in SQUARES], dtype=np.int64)
+
+# STEP[sq, d] / LAND[sq, d]: sq から方向 d に 1 / 2 マス先の黒マス番号（盤外は OFF）
+STEP = np.full((NUM_SQUARES, 4), OFF, dtype=np.int64)
+LAND = np.full((NUM_SQUARES, 4), OFF, dtype=np.int64)
+for _sq, (_r, _c) in enumerate(SQUARES):
+    for _d, (_dr, _dc) in enumerate(DIRECTIONS):
+        if 0 <= _r + _dr < BOARD_SIZE and 0 <= _c + _dc < BOARD_SIZE:
+            STEP[_sq, _d] = SQUARES.index((_r + _dr, _c + _dc))
+            if 0 <= _r + 2 * _dr < BOARD_SIZE and 0 <= _c + 2 * _dc < BOARD_SIZE:
+                LAND[_sq, _d] = SQUARES.index((_r + 2 * _dr, _c + 2 * _dc))
+
+# ACTION_INDEX[from_sq, to_sq]: ポリシー index（move.move_index と同じ値）
+ACTION_INDEX = (CELL_OF_SQUARE[:, None] * NUM_CELLS + CELL_OF_SQUARE[None, :]).astype(
+    np.int64
+)
+
+# 色の index（0: RED, 1: BLUE）ごとの 通常駒の移動方向 / 昇格マス
+COLORS = (RED, BLUE)
+MAN_DIR_OK = np.array(
+    [[d in KIND_DIRS[MAN_KIND[color]] for d in range(4)] for color in COLORS]
+)
+PROMOTION = np.array(
+    [[bool(PROMOTION_MASK[color] >> sq & 1) for sq in range(NUM_SQUARES)] for color in COLORS]
+)
+
+# 取った駒の経路は 1 マス 5bit（マス番号 + 1）で int64 に詰める
+_PATH_BITS = 5
+
+
+def _decode_path(path: int):
+    captured = []
+    while path:
+        captured.append(SQUARES[(path & 0x1F) - 1])
+        path >>= _PATH_BITS
+    return captured
+
+
+def batch_legal_moves(boards, turns):
+    """
+    boards: (N, 6, 6) の int8 配列（値は State.board と同じ 0, ±1, ±2）
+    turns : (N,) 手番（RED=1, BLUE=-1）
+
+    返り値 (masks, captures):
+      masks   : (N, 1296) bool。合法手の (移動元, 移動先) に対応する index が True
+      captures: 長さ N のリスト。各要素は {index: [captured_list, ...]}（ジャンプ手のみ）
+                同じ index に複数のジャンプ手がある場合は State.legal_actions() の順に並ぶ
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    turns = np.asarray(turns, dtype=np.int8)
+    n = len(boards)
+    if n == 0:
+        return np.zeros((0, ACTION_SIZE), dtype=bool), []
+
+    # 手番側を正、相手側を負にそろえる（番兵列 OFF は 0 だが空きマス扱いにしない）
+    rel = np.zeros((n, NUM_SQUARES + 1), dtype=np.int8)
+    rel[:, :NUM_SQUARES] = boards.reshape(n, -1)[:, CELL_OF_SQUARE] * turns[:, None]
+    own_man = rel == 1
+    own_king = rel == 2
+    opp = rel < 0
+    empty = rel == 0
+    empty[:, OFF] = False
+    color = (turns == BLUE).astype(np.int64)
+
+    masks = np.zeros((n, ACTION_SIZE), dtype=bool)
+    captures = [{} for _ in range(n)]
+
+    # 1. ジャンプ手
+    # 1段目は盤面全体 (N, 18, 4) で一括判定（最終段の通常駒はジャンプ時キング扱い）
+    man_dir_ok = MAN_DIR_OK[color][:, None, :]
+    as_king = own_king[:, :NUM_SQUARES] | (
+        own_man[:, :NUM_SQUARES] & PROMOTION[color]
+    )
+    single = (
+        (as_king[:, :, None] | (own_man[:, :NUM_SQUARES, None] & man_dir_ok))
+        & opp[:, STEP]
+        & empty[:, LAND]
+    )
+    b, origin, fd = np.nonzero(single)
+    m = STEP[origin, fd]
+    sq = LAND[origin, fd]
+    king = own_king[b, origin]
+    captured = np.int64(1) << m  # 取った駒のビットマスク
+    path = m + 1  # 取った順の経路
+    dir_code = fd.astype(np.int64)  # 方向の列（探索順の並べ替え用）
+
+    # 2段目以降は「探索途中のジャンプ」の配列を1段ずつ伸ばす
+    depth = 1
+    finished = []
+    while len(b):
+        # 最終段にいる通常駒はジャンプ中はキングとして動ける
+        as_king = king | PROMOTION[color[b], sq]
+        dir_ok = as_king[:, None] | MAN_DIR_OK[color[b]]
+        mid = STEP[sq]
+        land = LAND[sq]
+        can = (
+            dir_ok
+            & opp[b[:, None], mid]
+            & empty[b[:, None], land]
+            & ((captured[:, None] >> mid) & 1 == 0)
+        )
+
+        # これ以上ジャンプできない → ここを終点とするジャンプ手として確定
+        done = ~can.any(axis=1)
+        if done.any():
+            finished.append(
+                (
+                    b[done],
+                    origin[done],
+                    sq[done],
+                    captured[done],
+                    path[done],
+                    dir_code[done],
+                    np.full(done.sum(), depth),
+                )
+            )
+
+        fi, fd = np.nonzero(can)
+        m = mid[fi, fd]
+        b, origin, king = b[fi], origin[fi], king[fi]
+        sq = land[fi, fd]
+        captured = captured[fi] | (np.int64(1) << m)
+        path = path[fi] | ((m + 1) << (_PATH_BITS * depth))
+        dir_code = dir_code[fi] * 4 + fd
+        depth += 1
+
+    has_jump = np.zeros(n, dtype=bool)
+    if finished:
+        fb, fo, ft, fcap, fpath, fcode, fdepth = (
+            np.concatenate(col) for col in zip(*finished)
+        )
+        has_jump[fb] = True
+        masks[fb, ACTION_INDEX[fo, ft]] = True
+
+        # 逐次版の深さ優先探索と同じ順（局面 → 移動元 → 方向の辞書順）に並べ、
+        # 取る順番だけが違う重複（同じ移動元・移動先・取った駒）は最初の1つだけ残す
+        order = np.lexsort((fcode << (2 * (fdepth.max() - fdepth)), fo, fb))
+        key = (((fb * NUM_SQUARES + fo) * NUM_SQUARES + ft) << NUM_SQUARES) | fcap
+        _, first = np.unique(key[order], return_index=True)
+        sel = order[np.sort(first)]
+        for i, idx, p in zip(
+            fb[sel].tolist(), ACTION_INDEX[fo[sel], ft[sel]].tolist(), fpath[sel].tolist()
+        ):
+            captures[i].setdefault(idx, []).append(_decode_path(p))
+
+    # 2. 通常手（ジャンプ手がない局面のみ）
+    dir_ok = own_king[:, :NUM_SQUARES, None] | (
+        own_man[:, :NUM_SQUARES, None] & man_dir_ok
+    )
+    normal = dir_ok & empty[:, STEP] & ~has_jump[:, None, None]
+    nb, ns, nd = np.nonzero(normal)
+    masks[nb, ACTION_INDEX[ns, STEP[ns, nd]]] = True
+
+    return masks, captures
@@ -0,0 +1,308 @@
+# ビットボードによる 6x6 チェッカーの盤面表現と合法手生成
+#
+# 駒が置けるのは黒マス ((r + c) % 2 == 1) の 18 マスだけなので、
+# 黒マスを行優先で 0〜17 に番号付けし、
+#   RED 通常駒 / RED キング / BLUE 通常駒 / BLUE キング
+# をそれぞれ 18bit の int で持つ。
+# ルール（強制ジャンプ・多段ジャンプ・ジャンプ途中の昇格）は
+# 従来の 6x6 2次元リスト版 State と完全に一致させている。
+
+BOARD_SIZE = 6
+RED = 1  # 上側
+BLUE = -1  # 下側
+
+# この手数に達したら引き分け（State.is_draw）
+DRAW_TURN_COUNT = 50
+
+# 黒マスの座標一覧（index = マス番号）。行優先なので、ビット順に走査すると
+# 2次元リストを r, c の順に走査したときと同じ順番になる
+SQUARES = tuple(
+    (r, c)
+    for r in range(BOARD_SIZE)
+    for c in range(BOARD_SIZE)
+    if (r + c) % 2 == 1
+)
+NUM_SQUARES = len(SQUARES)  # 18
+FULL_MASK = (1 << NUM_SQUARES) - 1
+
+# (r, c) -> マス番号（白マスは -1）
+SQUARE_INDEX = [[-1] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+for _i, (_r, _c) in enumerate(SQUARES):
+    SQUARE_INDEX[_r][_c] = _i
+
+# 斜め4方向（従来実装の方向順と同じ）
+DIRECTIONS = ((1, -1), (1, 1), (-1, -1), (-1, 1))
+
+# 駒の種類（移動方向の違い）
+RED_MAN = 0  # 下方向のみ
+BLUE_MAN = 1  # 上方向のみ
+KING = 2  # 4方向
+KIND_DIRS = ((0, 1), (2, 3), (0, 1, 2, 3))
+
+# 通常駒の種類・昇格マス（RED は最下段、BLUE は最上段）
+MAN_KIND = {RED: RED_MAN, BLUE: BLUE_MAN}
+PROMOTION_MASK = {
+    RED: sum(1 << i for i, (r, _) in enumerate(SQUARES) if r == BOARD_SIZE - 1),
+    BLUE: sum(1 << i for i, (r, _) in enumerate(SQUARES) if r == 0),
+}
+
+
+def _target(sq: int, dr: int, dc: int, dist: int) -> int:
+    r, c = SQUARES[sq]
+    r, c = r + dr * dist, c + dc * dist
+    if 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+        return SQUARE_INDEX[r][c]
+    return -1
+
+
+# マスごとの事前計算テーブル
+#   MOVES[kind][sq]      : 通常移動 (to_sq, to_bit) のタプル
+#   JUMPS[kind][sq]      : ジャンプ (mid_sq, mid_bit, land_sq, land_bit) のタプル
+#   MOVE_MASKS[kind][sq] : 通常移動先のビットマスク
+#   JUMP_MASKS[kind][sq] : 飛び越える相手駒のマスのビットマスク
+MOVES = []
+JUMPS = []
+MOVE_MASKS = []
+JUMP_MASKS = []
+for _dirs in KIND_DIRS:
+    _moves, _jumps, _move_masks, _jump_masks = [], [], [], []
+    for _sq in range(NUM_SQUARES):
+        _m, _j = [], []
+        for _d in _dirs:
+            _dr, _dc = DIRECTIONS[_d]
+            _to = _target(_sq, _dr, _dc, 1)
+            _land = _target(_sq, _dr, _dc, 2)
+            if _to >= 0:
+                _m.append((_to, 1 << _to))
+            if _to >= 0 and _land >= 0:
+                _j.append((_to, 1 << _to, _land, 1 << _land))
+        _moves.append(tuple(_m))
+        _jumps.append(tuple(_j))
+        _move_masks.append(sum(bit for _, bit in _m))
+        _jump_masks.append(sum(mid_bit for _, mid_bit, _, _ in _j))
+    MOVES.append(tuple(_moves))
+    JUMPS.append(tuple(_jumps))
+    MOVE_MASKS.append(tuple(_move_masks))
+    JUMP_MASKS.append(tuple(_jump_masks))
+MOVES = tuple(MOVES)
+JUMPS = tuple(JUMPS)
+MOVE_MASKS = tuple(MOVE_MASKS)
+JUMP_MASKS = tuple(JUMP_MASKS)
+
+
+def iter_bits(bits: int):
+    """立っているビットのマス番号を小さい順に返す"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+# 2次元リスト <-> ビットボード 変換
+def board_to_bits(board):
+    """
+    6x6 の2次元リスト[int] を (red_men, red_kings, blue_men, blue_kings) に変換する。
+    白マスに駒がある・未知の値があるときは ValueError。
+    """
+    red_men = red_kings = blue_men = blue_kings = 0
+    for r in range(BOARD_SIZE):
+        for c in range(BOARD_SIZE):
+            v = board[r][c]
+            if v == 0:
+                continue
+            sq = SQUARE_INDEX[r][c]
+            if sq < 0:
+                raise ValueError(f"白マス ({r},{c}) に駒があります: {v}")
+            bit = 1 << sq
+            if v == RED:
+                red_men |= bit
+            elif v == 2 * RED:
+                red_kings |= bit
+            elif v == BLUE:
+                blue_men |= bit
+            elif v == 2 * BLUE:
+                blue_kings |= bit
+            else:
+                raise ValueError(f"不正な駒の値です: ({r},{c}) = {v}")
+    return red_men, red_kings, blue_men, blue_kings
+
+
+def bits_to_board(red_men, red_kings, blue_men, blue_kings):
+    """ビットボードから 6x6 の2次元リスト[int] を新しく作って返す"""
+    board = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+    for bits, v in (
+        (red_men, RED),
+        (red_kings, 2 * RED),
+        (blue_men, BLUE),
+        (blue_kings, 2 * BLUE),
+    ):
+        for sq in iter_bits(bits):
+            r, c = SQUARES[sq]
+            board[r][c] = v
+    return board
+
+
+# 初期配置（上2段に RED、下2段に BLUE）
+INITIAL_BITS = (
+    sum(1 << i for i, (r, _) in enumerate(SQUARES) if r < 2),
+    0,
+    sum(1 << i for i, (r, _) in enumerate(SQUARES) if r > BOARD_SIZE - 3),
+    0,
+)
+
+
+# 指し手のパック形式（1つの int）
+#   bit 0-4  : 移動元のマス番号
+#   bit 5-9  : 移動先のマス番号
+#   bit 10-  : 取った駒のマスのビットマスク（18bit）
+SQUARE_BITS = 0x1F
+MOVE_TO_SHIFT = 5
+MOVE_CAPTURE_SHIFT = 10
+
+
+def pack_move(from_sq: int, to_sq: int, captured: int = 0) -> int:
+    return from_sq | to_sq << MOVE_TO_SHIFT | captured << MOVE_CAPTURE_SHIFT
+
+
+def move_from(move: int) -> int:
+    return move & SQUARE_BITS
+
+
+def move_to(move: int) -> int:
+    return move >> MOVE_TO_SHIFT & SQUARE_BITS
+
+
+def move_captured(move: int) -> int:
+    return move >> MOVE_CAPTURE_SHIFT
+
+
+# 合法手生成
+def _search_jumps(start, sq, is_king, color, opp, empty, captured, moves):
+    """
+    多段ジャンプを再帰的に探索する（従来の State._search_jumps と同じ探索順）。
+    start: 最初に動かした駒のマス番号
+    sq: 現在のマス番号
+    captured: これまでに取った駒のビットマスク
+    盤面は書き換えないので、元のマスと取った駒は探索中も「埋まっている」扱いになる。
+    """
+    # ジャンプ中に最終段へ到達した通常駒は、そのマスではキングとして動ける
+    if is_king or PROMOTION_MASK[color] >> sq & 1:
+        kind = KING
+    else:
+        kind = MAN_KIND[color]
+
+    extended = False
+    for _, mid_bit, land_sq, land_bit in JUMPS[kind][sq]:
+        # 間に（まだ取っていない）相手駒がいて、着地マスが空いている
+        if land_bit & empty and mid_bit & opp and not mid_bit & captured:
+            extended = True
+            _search_jumps(
+                start, land_sq, is_king, color, opp, empty, captured | mid_bit, moves
+            )
+
+    # これ以上ジャンプできない & 何かは既に取っている → ここを終点とするジャンプ手
+    if not extended and captured:
+        moves.append(start | sq << MOVE_TO_SHIFT | captured << MOVE_CAPTURE_SHIFT)
+
+
+def legal_moves(own_men, own_kings, opp, color):
+    """
+    手番側の合法手一覧をパック形式の int のリストで返す。
+    own_men / own_kings: 手番側の通常駒 / キング
+    opp: 相手の駒（通常駒 | キング）
+    取れる手があるときはジャンプ手のみ。
+    取る順番だけが違うジャンプ（移動元・移動先・取った駒が同じ）は同じ手なので1つにまとめる。
+    """
+    own = own_men | own_kings
+    empty = FULL_MASK & ~(own | opp)
+    man_kind = MAN_KIND[color]
+
+    # 1. ジャンプ手（どれか1つでもあれば通常手は不要）
+    jumps = []
+    for sq in iter_bits(own):
+        is_king = bool(own_kings >> sq & 1)
+        kind = KING if is_king or PROMOTION_MASK[color] >> sq & 1 else man_kind
+        if JUMP_MASKS[kind][sq] & opp:
+            _search_jumps(sq, sq, is_king, color, opp, empty, 0, jumps)
+    if jumps:
+        if len(jumps) > 1:
+            jumps = list(dict.fromkeys(jumps))
+        return jumps
+
+    # 2. 通常手
+    normals = []
+    for sq in iter_bits(own):
+        kind = KING if own_kings >> sq & 1 else man_kind
+        if not MOVE_MASKS[kind][sq] & empty:
+            continue
+        for to_sq, to_bit in MOVES[kind][sq]:
+            if to_bit & empty:
+                normals.append(sq | to_sq << MOVE_TO_SHIFT)
+    return normals
+
+
+def jump_path(move, is_king, color, empty):
+    """
+    ジャンプ手で取った駒のマス番号を、取った順に並べて返す。
+    合法手生成と同じ順で探索するので、従来の captured_list と同じ順序になる。
+    is_king: 動かす駒がキングか
+    empty: 指す前の空きマス
+    """
+    start = move & SQUARE_BITS
+    to_sq = move >> MOVE_TO_SHIFT & SQUARE_BITS
+    target = move >> MOVE_CAPTURE_SHIFT
+    path = []
+
+    def dfs(sq, captured):
+        if captured == target:
+            return sq == to_sq
+        if is_king or PROMOTION_MASK[color] >> sq & 1:
+            kind = KING
+        else:
+            kind = MAN_KIND[color]
+        for mid_sq, mid_bit, land_sq, land_bit in JUMPS[kind][sq]:
+            if land_bit & empty and mid_bit & target and not mid_bit & captured:
+                path.append(mid_sq)
+                if dfs(land_sq, captured | mid_bit):
+                    return True
+                path.pop()
+        return False
+
+    if not dfs(start, 0):
+        raise ValueError(f"ジャンプの経路が見つかりません: {move}")
+    return path
+
+
+def apply_move(red_men, red_kings, blue_men, blue_kings, move):
+    """
+    パック形式の手を適用した新しい (red_men, red_kings, blue_men, blue_kings) を返す。
+    """
+    from_bit = 1 << (move & SQUARE_BITS)
+    to_bit = 1 << (move >> MOVE_TO_SHIFT & SQUARE_BITS)
+    keep = ~(from_bit | move >> MOVE_CAPTURE_SHIFT)
+
+    # 動かす駒を移動先に置き、元のマスと取った駒を消す
+    if red_men & from_bit:
+        red_men |= to_bit
+    elif red_kings & from_bit:
+        red_kings |= to_bit
+    elif blue_men & from_bit:
+        blue_men |= to_bit
+    elif blue_kings & from_bit:
+        blue_kings |= to_bit
+    else:
+        raise ValueError(f"マス {move & SQUARE_BITS} に駒がありません")
+    red_men &= keep
+    red_kings &= keep
+    blue_men &= keep
+    blue_kings &= keep
+
+    # 昇格判定
+    if red_men & to_bit & PROMOTION_MASK[RED]:
+        red_men ^= to_bit
+        red_kings |= to_bit
+    elif blue_men & to_bit & PROMOTION_MASK[BLUE]:
+        blue_men ^= to_bit
+        blue_kings |= to_bit
+
+    return red_men, red_kings, blue_men, blue_kings
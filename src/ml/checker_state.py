@@ -1,184 +1,258 @@
+from src.ml import bitboard, zobrist, symmetry, jit_moves
+from src.ml.move import action_to_move, move_to_action
+from src.ml.bitboard import (
+    BOARD_SIZE,
+    RED,
+    BLUE,
+    DRAW_TURN_COUNT,
+    INITIAL_BITS,
+    SQUARES,
+    PROMOTION_MASK,
+    iter_bits,
+    move_from,
+    move_to,
+    move_captured,
+)
+
+from weakref import WeakValueDictionary
+from numbers import Integral
 import random
 
-BOARD_SIZE = 6
-RED = 1  # 上側
-BLUE = -1  # 下側
-
 
 class State:
+    # 探索木のノードごとに大量に作られるので __dict__ を持たせない
+    __slots__ = (
+        "red_men",
+        "red_kings",
+        "blue_men",
+        "blue_kings",
+        "turn",
+        "turn_count",
+        "zobrist",
+        "_counts",
+        "_legal_moves",
+        "_legal_actions",
+        "_is_lose",
+        "__weakref__",
+    )
+
     def __init__(self, board=None, turn=RED, turn_count=0):
         """
-        board: 6x6 の2次元リスト[int]
+        board: 6x6 の2次元リスト[int]（None なら初期配置）
         turn: RED(1) or BLUE(-1)
         turn_count: 手数（引き分け判定用に利用）
+
+        内部では盤面をビットボード (bitboard.py) で保持する。
         """
         if board is None:
-            # 初期配置を Pygame版と同じにする
-            board = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-            for r in range(BOARD_SIZE):
-                for c in range(BOARD_SIZE):
-                    # 上2段に RED、下2段に BLUE を黒マス((r+c)%2==1)に配置
-                    if r < 2 and (r + c) % 2 == 1:
-                        board[r][c] = RED  # RED の通常駒
-                    elif r > BOARD_SIZE - 3 and (r + c) % 2 == 1:
-                        board[r][c] = BLUE  # BLUE の通常駒
-        self.board = board
+            # 初期配置を Pygame版と同じにする（上2段に RED、下2段に BLUE）
+            bits = INITIAL_BITS
+        else:
+            bits = bitboard.board_to_bits(board)
+        self.red_men, self.red_kings, self.blue_men, self.blue_kings = bits
         self.turn = turn
         self.turn_count = turn_count
+        # 盤面＋手番の Zobrist ハッシュ（next() では差分更新）
+        self.zobrist = zobrist.hash_bits(bits, turn)
+        # 駒の種類ごとの数（next() では取った駒・昇格の分だけ差分更新）
+        self._counts = _count_bits(bits)
+        self._reset_cache()
+
+    # 遅延評価キャッシュの初期化（State は生成後に変更しない前提）
+    def _reset_cache(self):
+        self._legal_moves = None  # 合法手一覧（パック形式）
+        self._legal_actions = None  # 合法手一覧（タプル形式）
+        self._is_lose = None  # 負け判定
+
+    # ビットボードから直接 State を作る（2次元リストを経由しない）
+    @classmethod
+    def from_bits(cls, bits, turn=RED, turn_count=0, zobrist_hash=None, packed_counts=None):
+        state = cls.__new__(cls)
+        state.red_men, state.red_kings, state.blue_men, state.blue_kings = bits
+        state.turn = turn
+        state.turn_count = turn_count
+        if zobrist_hash is None:
+            zobrist_hash = zobrist.hash_bits(bits, turn)
+        state.zobrist = zobrist_hash
+        state._counts = _count_bits(bits) if packed_counts is None else packed_counts
+        state._reset_cache()
+        return state
+
+    @property
+    def bits(self):
+        """(red_men, red_kings, blue_men, blue_kings)"""
+        return self.red_men, self.red_kings, self.blue_men, self.blue_kings
+
+    @property
+    def board(self):
+        """
+        6x6 の2次元リスト[int]（API・学習データ用）。
+        アクセスのたびに新しいリストを作るので、ループ内では一度変数に受けること。
+        """
+        return bitboard.bits_to_board(*self.bits)
+
+    # 駒のあるマスだけの一覧（最大12個。盤面全体を走査しないで済む）
+    def pieces(self):
+        """[(r, c, 駒の値), ...]（駒の値は board と同じ ±1, ±2）"""
+        return [
+            (*SQUARES[sq], v)
+            for b, v in zip(self.bits, (RED, 2 * RED, BLUE, 2 * BLUE))
+            for sq in iter_bits(b)
+        ]
+
+    @property
+    def counts(self):
+        """駒の種類ごとの数 (red_men, red_kings, blue_men, blue_kings)"""
+        c = self._counts
+        return tuple(c >> shift & _COUNT_MASK for shift in _COUNT_SHIFTS)
 
     # ある色の駒数を数える（通常駒＋キング）
     def piece_count(self, color: int) -> int:
-        cnt = 0
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                v = self.board[r][c]
-                if v != 0 and (1 if v > 0 else -1) == color:
-                    cnt += 1
-        return cnt
+        c = self._counts
+        if color == RED:
+            return (c & _COUNT_MASK) + (c >> _COUNT_BITS & _COUNT_MASK)
+        return (c >> 2 * _COUNT_BITS & _COUNT_MASK) + (c >> 3 * _COUNT_BITS)
 
-    # 負け判定：自分の駒がない or 合法手がない
+    # 負け判定：自分の駒がない or 合法手がない（初回のみ計算）
     def is_lose(self) -> bool:
-        if self.piece_count(self.turn) == 0:
-            return True
-        if not self.legal_actions():
-            return True
-        return False
+        if self._is_lose is None:
+            self._is_lose = self.piece_count(self.turn) == 0 or not self.legal_moves()
+        return self._is_lose
 
     # 超単純な引き分け判定（手数が多すぎたら引き分け扱い）
     def is_draw(self) -> bool:
-        return self.turn_count >= 50
+        return self.turn_count >= DRAW_TURN_COUNT
 
     # 終局かどうか
     def is_done(self) -> bool:
         return self.is_lose() or self.is_draw()
 
-    # そのマスの駒の移動方向（通常／キング、ジャンプ時の昇格も考慮）
-    def _dirs_for_piece(self, piece: int, r: int, jumps: bool = False):
-        color = RED if piece > 0 else BLUE
-        is_king = abs(piece) == 2
-
-        # ジャンプ探索のときは、最終段に到達していたらキング扱いにする（Pygame版と同じ思想）
-        if jumps and not is_king:
-            if color == RED and r == BOARD_SIZE - 1:
-                is_king = True
-            if color == BLUE and r == 0:
-                is_king = True
-
-        if is_king:
-            # キングは前後左右の斜めに進める
-            return [(1, -1), (1, 1), (-1, -1), (-1, 1)]
-        if color == RED:
-            # RED 通常駒は下方向に1マス
-            return [(1, -1), (1, 1)]
-        else:
-            # BLUE 通常駒は上方向に1マス
-            return [(-1, -1), (-1, 1)]
-
-    def _in_bounds(self, r: int, c: int) -> bool:
-        return 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE
-
-    # 多段ジャンプを再帰的に探索
-    def _search_jumps(self, start_r, start_c, r, c, piece, captured):
+    # 現在手番プレイヤーの合法手一覧（パック形式）
+    def legal_moves(self):
         """
-        start_r, start_c: 最初に動かした駒の位置
-        r, c: 現在位置
-        piece: 駒の種類 (1,2,-1,-2)
-        captured: これまでに取った駒の座標リスト
+        [move(int), ...]（形式は bitboard.pack_move、index 変換は move.move_index）
+        取れる手があるときはジャンプ手のみ許可（多段ジャンプ・ジャンプ中の昇格込み）
+        初回呼び出し時に生成してキャッシュし、以降は同じリストを返す（変更しないこと）。
+        Numba があれば JIT 版（jit_moves.py）で生成する。
         """
-        moves = []
-        dirs = self._dirs_for_piece(piece, r, jumps=True)
-        extended = False
-
-        for dr, dc in dirs:
-            mid_r, mid_c = r + dr, c + dc
-            land_r, land_c = r + 2 * dr, c + 2 * dc
-            if not (self._in_bounds(mid_r, mid_c) and self._in_bounds(land_r, land_c)):
-                continue
-
-            mid_v = self.board[mid_r][mid_c]
-            land_v = self.board[land_r][land_c]
-
-            # 間に敵駒がいて、着地マスが空いていて、まだその駒を取っていない
-            if (
-                land_v == 0
-                and mid_v != 0
-                and (1 if mid_v > 0 else -1) != (RED if piece > 0 else BLUE)
-                and (mid_r, mid_c) not in captured
-            ):
-                extended = True
-                new_captured = captured + [(mid_r, mid_c)]
-                # さらに多段ジャンプができるか探索
-                moves.extend(
-                    self._search_jumps(
-                        start_r, start_c, land_r, land_c, piece, new_captured
-                    )
+        if self._legal_moves is None:
+            if self.turn == RED:
+                self._legal_moves = jit_moves.legal_moves(
+                    self.red_men, self.red_kings, self.blue_men | self.blue_kings, RED
                 )
+            else:
+                self._legal_moves = jit_moves.legal_moves(
+                    self.blue_men, self.blue_kings, self.red_men | self.red_kings, BLUE
+                )
+        return self._legal_moves
 
-        # これ以上ジャンプできない & 何かは既に取っている → ここを終点とするジャンプ手
-        if not extended and captured:
-            moves.append((start_r, start_c, r, c, captured))
-
-        return moves
-
-    # 1つの駒についての合法手（通常＋ジャンプ）
-    def _moves_for_piece(self, r, c):
-        piece = self.board[r][c]
-        if piece == 0:
-            return [], []
-        color = RED if piece > 0 else BLUE
-        if color != self.turn:
-            return [], []
-
-        # 1. ジャンプ手を探索（あれば通常手は無視）
-        jumps = self._search_jumps(r, c, r, c, piece, [])
-        normals = []
-
-        # 2. ジャンプ手が無いときだけ通常手を生成
-        if not jumps:
-            for dr, dc in self._dirs_for_piece(piece, r, jumps=False):
-                nr, nc = r + dr, c + dc
-                if self._in_bounds(nr, nc) and self.board[nr][nc] == 0:
-                    normals.append((r, c, nr, nc, []))
-
-        return normals, jumps
-
-    # 現在手番プレイヤーの合法手一覧
+    # 現在手番プレイヤーの合法手一覧（タプル形式）
     def legal_actions(self):
-        all_normals = []
-        all_jumps = []
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                normals, jumps = self._moves_for_piece(r, c)
-                all_normals.extend(normals)
-                all_jumps.extend(jumps)
-        # 取れる手があるときはジャンプ手のみ許可
-        return all_jumps if all_jumps else all_normals
+        """
+        [(fr, fc, tr, tc, captured_list), ...]（legal_moves() と同じ順序）
+        API・対話入力用。探索や学習では legal_moves() を使う。
+        """
+        if self._legal_actions is None:
+            self._legal_actions = [move_to_action(m, self) for m in self.legal_moves()]
+        return self._legal_actions
 
     # 次の状態を返す
     def next(self, action):
         """
-        action = (from_r, from_c, to_r, to_c, captured_list)
+        action: パック形式の手(int) または (from_r, from_c, to_r, to_c, captured_list)
         """
-        fr, fc, tr, tc, captured = action
-
-        # 盤面コピー
-        new_board = [row[:] for row in self.board]
-
-        # 駒を動かし、取った駒を消す
-        piece = new_board[fr][fc]
-        new_board[fr][fc] = 0
-        for cr, cc in captured:
-            new_board[cr][cc] = 0
-        new_board[tr][tc] = piece
-
-        # 昇格判定
-        color = RED if piece > 0 else BLUE
-        if abs(piece) == 1:
-            if (color == RED and tr == BOARD_SIZE - 1) or (color == BLUE and tr == 0):
-                new_board[tr][tc] = 2 if color == RED else -2
+        # NumPy の整数（np.int64・本の uint32 など）もパック形式の手として受け付ける
+        move = int(action) if isinstance(action, Integral) else action_to_move(action)
+
+        # 駒の移動・取った駒の削除・昇格判定と、変化したマスのハッシュ差分
+        old_bits = self.bits
+        bits, diff = jit_moves.apply_move_hash(*old_bits, move)
+
+        # ハッシュは変化したマスと手番だけ差分更新
+        zobrist_hash = self.zobrist ^ diff ^ zobrist.SIDE_KEY
+
+        # 駒数は取った駒と昇格の分だけ差分更新
+        counts = self._counts
+        own_men, own_kings, opp_men, opp_kings = (
+            (0, 1, 2, 3) if self.turn == RED else (2, 3, 0, 1)
+        )
+        captured = move_captured(move)
+        if captured:
+            counts -= (captured & old_bits[opp_men]).bit_count() << _COUNT_SHIFTS[opp_men]
+            counts -= (captured & old_bits[opp_kings]).bit_count() << _COUNT_SHIFTS[
+                opp_kings
+            ]
+        if (
+            old_bits[own_men] >> move_from(move) & 1
+            and PROMOTION_MASK[self.turn] >> move_to(move) & 1
+        ):
+            counts += (1 << _COUNT_SHIFTS[own_kings]) - (1 << _COUNT_SHIFTS[own_men])
 
         # 手番交代
-        return State(new_board, turn=-self.turn, turn_count=self.turn_count + 1)
+        return State.from_bits(
+            bits,
+            turn=-self.turn,
+            turn_count=self.turn_count + 1,
+            zobrist_hash=zobrist_hash,
+            packed_counts=counts,
+        )
+
+    # 同じ局面の State を1つにまとめる
+    def interned(self):
+        """
+        同じ局面（__eq__ が True）の State がすでに生きていればそれを返し、
+        なければ自分を登録して返す。探索木の合流（手順違いの同一局面）で
+        State と合法手のキャッシュを共有できる。参照がなくなれば自動で消える。
+        """
+        state = _interned.get(self)
+        if state is None:
+            _interned[self] = self
+            state = self
+        return state
+
+    # 対称変換した局面（symmetry.ROTATE_SWAP なら180度回転 + 色の入れ替えで手番も入れ替わる）
+    def transformed(self, transform=symmetry.ROTATE_SWAP):
+        if transform == symmetry.IDENTITY:
+            return self
+        return State.from_bits(
+            symmetry.transform_bits(self.bits, transform),
+            turn=-self.turn,
+            turn_count=self.turn_count,
+        )
+
+    # 正規形（RED の手番にそろえた局面）
+    def canonical(self):
+        """
+        (正規形の State, 使った変換) を返す。
+        手は symmetry.transform_move、ポリシーは symmetry.policy_to_canonical /
+        policy_from_canonical で同じ変換を使って行き来する。
+        """
+        transform = symmetry.canonical_transform(self.turn)
+        return self.transformed(transform), transform
+
+    # 局面キー（盤面＋手番＋引き分け判定に効く範囲の手数）
+    @property
+    def key(self) -> int:
+        """
+        64bit の局面キー。手数は引き分け判定に影響するので含めるが、
+        DRAW_TURN_COUNT 以上はどれも同じ扱いなので丸める。
+        NN の入力のように手数に依存しない用途では self.zobrist を使う。
+        """
+        return self.zobrist ^ zobrist.turn_count_key(self.turn_count)
+
+    def __hash__(self):
+        return self.key
+
+    def __eq__(self, other):
+        if not isinstance(other, State):
+            return NotImplemented
+        return (
+            self.zobrist == other.zobrist
+            and self.bits == other.bits
+            and self.turn == other.turn
+            and min(self.turn_count, DRAW_TURN_COUNT)
+            == min(other.turn_count, DRAW_TURN_COUNT)
+        )
 
     # 先手かどうか（AlphaZero側で使う想定）
     def is_first_player(self):
@@ -193,15 +267,31 @@ class State:
             BLUE: "b",  # BLUE 通常
             -2: "B",  # BLUE キング
         }
+        board = self.board
         s = ""
         for r in range(BOARD_SIZE):
             for c in range(BOARD_SIZE):
-                s += symbols[self.board[r][c]]
+                s += symbols[board[r][c]]
             s += "\n"
         s += f"Turn: {'RED' if self.turn == RED else 'BLUE'}\n"
         return s
 
 
+# State.interned() の登録先（生きている State だけを弱参照で持つ）
+_interned = WeakValueDictionary()
+
+
+# 駒数は種類ごとに 5bit ずつ1つの int に詰めて持つ（タプルより小さい）
+_COUNT_BITS = 5
+_COUNT_MASK = (1 << _COUNT_BITS) - 1
+_COUNT_SHIFTS = tuple(_COUNT_BITS * i for i in range(4))
+
+
+# 駒の種類ごとの数 (red_men, red_kings, blue_men, blue_kings) を詰めた int
+def _count_bits(bits):
+    return sum(b.bit_count() << shift for b, shift in zip(bits, _COUNT_SHIFTS))
+
+
 # プレイヤー入力（番号で手を選ぶ）
 def input_action(state: State):
     legal_actions = state.legal_actions()
@@ -0,0 +1,400 @@
+# Numba で JIT コンパイルした合法手生成・着手・終局判定
+#
+# bitboard.py と同じビットボード (int) を受け取り、同じ順序・同じ形式の手を返す。
+# Numba が import できれば State / Position の合法手生成・終局判定はこちらを使い、
+# なければ bitboard.py の純 Python 版にそのまま戻る（結果は同じ）。
+# numba は requirements.txt に入っている（探索木 mcts_tree.py の降下・逆伝播もこれに頼る）。
+# 環境変数 DISABLE_NUMBA=1 で Numba があっても純 Python 版を使う。
+#
+#   python -m src.ml.perft --depth 8 --engine numba
+
+from src.ml import bitboard, zobrist
+from src.ml.bitboard import (
+    RED,
+    NUM_SQUARES,
+    FULL_MASK,
+    KIND_DIRS,
+    KING,
+    MAN_KIND,
+    PROMOTION_MASK,
+    MOVES,
+    JUMPS,
+    MOVE_MASKS,
+    JUMP_MASKS,
+    MOVE_TO_SHIFT,
+    MOVE_CAPTURE_SHIFT,
+    SQUARE_BITS,
+)
+
+from dotenv import load_dotenv
+import numpy as np
+import os
+
+load_dotenv()
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Numba を使うかどうか
+AVAILABLE = njit is not None and os.getenv("DISABLE_NUMBA") != "1"
+
+if njit is None:
+    # Numba がなくても下の関数を（遅いが）そのまま呼べるようにする
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+# 1局面の合法手の最大数（6x6 では 30 手程度なので余裕を持たせる）
+MAX_MOVES = 128
+# 多段ジャンプの最大段数（取れる駒は最大 6 個）
+MAX_JUMP_DEPTH = 16
+
+# bitboard.py の事前計算テーブルを配列に変換（-1 は番兵）
+_MAX_DIRS = max(len(d) for d in KIND_DIRS)
+MOVE_TO = np.full((len(KIND_DIRS), NUM_SQUARES, _MAX_DIRS), -1, dtype=np.int64)
+MOVE_N = np.zeros((len(KIND_DIRS), NUM_SQUARES), dtype=np.int64)
+JUMP_MID = np.full((len(KIND_DIRS), NUM_SQUARES, _MAX_DIRS), -1, dtype=np.int64)
+JUMP_LAND = np.full((len(KIND_DIRS), NUM_SQUARES, _MAX_DIRS), -1, dtype=np.int64)
+JUMP_N = np.zeros((len(KIND_DIRS), NUM_SQUARES), dtype=np.int64)
+for _kind in range(len(KIND_DIRS)):
+    for _sq in range(NUM_SQUARES):
+        MOVE_N[_kind, _sq] = len(MOVES[_kind][_sq])
+        for _k, (_to, _) in enumerate(MOVES[_kind][_sq]):
+            MOVE_TO[_kind, _sq, _k] = _to
+        JUMP_N[_kind, _sq] = len(JUMPS[_kind][_sq])
+        for _k, (_mid, _, _land, _) in enumerate(JUMPS[_kind][_sq]):
+            JUMP_MID[_kind, _sq, _k] = _mid
+            JUMP_LAND[_kind, _sq, _k] = _land
+MOVE_MASK = np.array(MOVE_MASKS, dtype=np.int64)
+JUMP_MASK = np.array(JUMP_MASKS, dtype=np.int64)
+
+# Zobrist の乱数（Numba で扱えるように符号付き 64bit に読み替える）
+_MASK64 = (1 << 64) - 1
+PIECE_KEYS = np.array(
+    [[k - (1 << 64) if k >> 63 else k for k in keys] for keys in zobrist.PIECE_KEYS],
+    dtype=np.int64,
+)
+
+# 色の index（0: RED, 1: BLUE）ごとの 通常駒の種類 / 昇格マス
+MAN_KINDS = np.array([MAN_KIND[RED], MAN_KIND[-RED]], dtype=np.int64)
+PROMOTION = np.array([PROMOTION_MASK[RED], PROMOTION_MASK[-RED]], dtype=np.int64)
+
+
+# カーネルが参照する bitboard.py / zobrist.py 由来のグローバル
+# Numba はグローバルをコンパイル時の定数として埋め込み、cache=True ではその値のまま
+# ディスクに保存する（キャッシュが無効になるのはこのファイルを変えたときだけ）。
+# テーブルや Zobrist の乱数を変えても古い値のカーネルが読み込まれないように、
+# import 時に埋め込まれた値と今の値を比べ、違えばキャッシュを捨てて作り直す (_check_cache)。
+# 引数で渡すと呼び出しのたびに型判定が入って合法手生成が倍近く遅くなるので、グローバルのままにする。
+_GLOBALS = (
+    FULL_MASK,
+    KING,
+    MOVE_TO_SHIFT,
+    MOVE_CAPTURE_SHIFT,
+    SQUARE_BITS,
+    MOVE_TO,
+    MOVE_N,
+    JUMP_MID,
+    JUMP_LAND,
+    JUMP_N,
+    MOVE_MASK,
+    JUMP_MASK,
+    MAN_KINDS,
+    PROMOTION,
+    PIECE_KEYS,
+)
+
+
+@njit(cache=True)
+def _frozen_globals():
+    """キャッシュ済みのカーネルに埋め込まれている _GLOBALS の値"""
+    return (
+        FULL_MASK,
+        KING,
+        MOVE_TO_SHIFT,
+        MOVE_CAPTURE_SHIFT,
+        SQUARE_BITS,
+        MOVE_TO,
+        MOVE_N,
+        JUMP_MID,
+        JUMP_LAND,
+        JUMP_N,
+        MOVE_MASK,
+        JUMP_MASK,
+        MAN_KINDS,
+        PROMOTION,
+        PIECE_KEYS,
+    )
+
+
+@njit(cache=True)
+def _legal_moves(own_men, own_kings, opp, ci, moves):
+    """
+    bitboard.legal_moves と同じ手を同じ順で moves に書き込み、手の数を返す。
+    ci: 手番の色の index（0: RED, 1: BLUE）
+    多段ジャンプの再帰は明示的なスタックで同じ順にたどる。
+    """
+    own = own_men | own_kings
+    empty = FULL_MASK & ~(own | opp)
+    man_kind = MAN_KINDS[ci]
+    promotion = PROMOTION[ci]
+    n = 0
+
+    # 1. ジャンプ手
+    st_sq = np.empty(MAX_JUMP_DEPTH, dtype=np.int64)
+    st_cap = np.empty(MAX_JUMP_DEPTH, dtype=np.int64)
+    st_k = np.empty(MAX_JUMP_DEPTH, dtype=np.int64)
+    st_ext = np.empty(MAX_JUMP_DEPTH, dtype=np.bool_)
+    bits = own
+    while bits:
+        start = 0
+        while not (bits >> start) & 1:
+            start += 1
+        bits &= bits - 1
+        is_king = ((own_kings >> start) & 1) == 1
+        kind = KING if is_king or (promotion >> start) & 1 else man_kind
+        if not JUMP_MASK[kind, start] & opp:
+            continue
+
+        depth = 0
+        st_sq[0] = start
+        st_cap[0] = 0
+        st_k[0] = 0
+        st_ext[0] = False
+        while depth >= 0:
+            sq = st_sq[depth]
+            cap = st_cap[depth]
+            kind = KING if is_king or (promotion >> sq) & 1 else man_kind
+            k = st_k[depth]
+            pushed = False
+            while k < JUMP_N[kind, sq]:
+                mid = JUMP_MID[kind, sq, k]
+                land = JUMP_LAND[kind, sq, k]
+                k += 1
+                if (empty >> land) & 1 and (opp >> mid) & 1 and not (cap >> mid) & 1:
+                    st_k[depth] = k
+                    st_ext[depth] = True
+                    depth += 1
+                    st_sq[depth] = land
+                    st_cap[depth] = cap | (1 << mid)
+                    st_k[depth] = 0
+                    st_ext[depth] = False
+                    pushed = True
+                    break
+            if pushed:
+                continue
+
+            # これ以上ジャンプできない → ジャンプ手として確定（同じ手は最初の1つだけ）
+            if not st_ext[depth] and cap:
+                move = start | sq << MOVE_TO_SHIFT | cap << MOVE_CAPTURE_SHIFT
+                dup = False
+                for i in range(n):
+                    if moves[i] == move:
+                        dup = True
+                        break
+                if not dup:
+                    moves[n] = move
+                    n += 1
+            depth -= 1
+    if n:
+        return n
+
+    # 2. 通常手
+    bits = own
+    while bits:
+        sq = 0
+        while not (bits >> sq) & 1:
+            sq += 1
+        bits &= bits - 1
+        kind = KING if (own_kings >> sq) & 1 else man_kind
+        if not MOVE_MASK[kind, sq] & empty:
+            continue
+        for k in range(MOVE_N[kind, sq]):
+            to_sq = MOVE_TO[kind, sq, k]
+            if (empty >> to_sq) & 1:
+                moves[n] = sq | to_sq << MOVE_TO_SHIFT
+                n += 1
+    return n
+
+
+@njit(cache=True)
+def _legal_moves_array(own_men, own_kings, opp, ci):
+    moves = np.empty(MAX_MOVES, dtype=np.int64)
+    n = _legal_moves(own_men, own_kings, opp, ci, moves)
+    return moves[:n]
+
+
+@njit(cache=True)
+def _apply_move(red_men, red_kings, blue_men, blue_kings, move):
+    """bitboard.apply_move と同じ（駒がないマスの手は渡さないこと）"""
+    from_bit = 1 << (move & SQUARE_BITS)
+    to_bit = 1 << (move >> MOVE_TO_SHIFT & SQUARE_BITS)
+    keep = ~(from_bit | move >> MOVE_CAPTURE_SHIFT)
+    if red_men & from_bit:
+        red_men |= to_bit
+    elif red_kings & from_bit:
+        red_kings |= to_bit
+    elif blue_men & from_bit:
+        blue_men |= to_bit
+    else:
+        blue_kings |= to_bit
+    red_men &= keep
+    red_kings &= keep
+    blue_men &= keep
+    blue_kings &= keep
+    if red_men & to_bit & PROMOTION[0]:
+        red_men ^= to_bit
+        red_kings |= to_bit
+    elif blue_men & to_bit & PROMOTION[1]:
+        blue_men ^= to_bit
+        blue_kings |= to_bit
+    return red_men, red_kings, blue_men, blue_kings
+
+
+@njit(cache=True)
+def _apply_move_hash(red_men, red_kings, blue_men, blue_kings, move):
+    """着手後のビットボードと、Zobrist ハッシュの差分（変化したマスの XOR）を返す"""
+    new = _apply_move(red_men, red_kings, blue_men, blue_kings, move)
+    old = (red_men, red_kings, blue_men, blue_kings)
+    h = 0
+    for kind in range(4):
+        changed = old[kind] ^ new[kind]
+        while changed:
+            sq = 0
+            while not (changed >> sq) & 1:
+                sq += 1
+            changed &= changed - 1
+            h ^= PIECE_KEYS[kind, sq]
+    return new[0], new[1], new[2], new[3], h
+
+
+@njit(cache=True)
+def _is_lose(own_men, own_kings, opp, ci):
+    """負け判定（自分の駒がない or 合法手がない）。手を全部は作らずに判定する"""
+    own = own_men | own_kings
+    if own == 0:
+        return True
+    empty = FULL_MASK & ~(own | opp)
+    man_kind = MAN_KINDS[ci]
+    promotion = PROMOTION[ci]
+    bits = own
+    while bits:
+        sq = 0
+        while not (bits >> sq) & 1:
+            sq += 1
+        bits &= bits - 1
+        is_king = (own_kings >> sq) & 1
+        if MOVE_MASK[KING if is_king else man_kind, sq] & empty:
+            return False
+        kind = KING if is_king or (promotion >> sq) & 1 else man_kind
+        for k in range(JUMP_N[kind, sq]):
+            if (opp >> JUMP_MID[kind, sq, k]) & 1 and (empty >> JUMP_LAND[kind, sq, k]) & 1:
+                return False
+    return True
+
+
+@njit(cache=True)
+def _perft(red_men, red_kings, blue_men, blue_kings, ci, depth, counts):
+    """
+    perft.py と同じ数え方（counts = [nodes, captures, multi_jumps, promotions]）。
+    """
+    moves = np.empty(MAX_MOVES, dtype=np.int64)
+    if ci == 0:
+        own_men = red_men
+        n = _legal_moves(red_men, red_kings, blue_men | blue_kings, 0, moves)
+    else:
+        own_men = blue_men
+        n = _legal_moves(blue_men, blue_kings, red_men | red_kings, 1, moves)
+    if depth == 1:
+        counts[0] += n
+        for i in range(n):
+            move = moves[i]
+            captured = move >> MOVE_CAPTURE_SHIFT
+            if captured:
+                counts[1] += 1
+                if captured & (captured - 1):
+                    counts[2] += 1
+            if (own_men >> (move & SQUARE_BITS)) & 1 and (
+                PROMOTION[ci] >> (move >> MOVE_TO_SHIFT & SQUARE_BITS)
+            ) & 1:
+                counts[3] += 1
+        return
+    for i in range(n):
+        rm, rk, bm, bk = _apply_move(red_men, red_kings, blue_men, blue_kings, moves[i])
+        _perft(rm, rk, bm, bk, 1 - ci, depth - 1, counts)
+
+
+# Python から呼ぶ入口（bitboard.py と同じ引数・返り値）
+def _jit_legal_moves(own_men, own_kings, opp, color):
+    return _legal_moves_array(own_men, own_kings, opp, 0 if color == RED else 1).tolist()
+
+
+def _jit_apply_move_hash(red_men, red_kings, blue_men, blue_kings, move):
+    *bits, h = _apply_move_hash(red_men, red_kings, blue_men, blue_kings, move)
+    return tuple(bits), h & _MASK64
+
+
+def _py_apply_move_hash(red_men, red_kings, blue_men, blue_kings, move):
+    old_bits = (red_men, red_kings, blue_men, blue_kings)
+    bits = bitboard.apply_move(*old_bits, move)
+    return bits, zobrist.diff(old_bits, bits)
+
+
+def _jit_is_lose(own_men, own_kings, opp, color):
+    return bool(_is_lose(own_men, own_kings, opp, 0 if color == RED else 1))
+
+
+def _py_is_lose(own_men, own_kings, opp, color):
+    return (own_men | own_kings) == 0 or not bitboard.legal_moves(
+        own_men, own_kings, opp, color
+    )
+
+
+def perft(bits, turn, depth):
+    """JIT 版 perft（perft.py の numba エンジン）"""
+    counts = np.zeros(4, dtype=np.int64)
+    _perft(*bits, 0 if turn == RED else 1, depth, counts)
+    nodes, captures, multi_jumps, promotions = counts.tolist()
+    return {
+        "nodes": nodes,
+        "captures": captures,
+        "multi_jumps": multi_jumps,
+        "promotions": promotions,
+    }
+
+
+# キャッシュ済みのカーネルが今と違うテーブルで作られていたらキャッシュを捨てる
+def _check_cache():
+    frozen = _frozen_globals()
+    if all(np.array_equal(a, b) for a, b in zip(frozen, _GLOBALS)):
+        return
+    # recompile はキャッシュを消し、まだ呼ばれていないカーネルは次の呼び出しで作り直される
+    for kernel in (
+        _frozen_globals,
+        _legal_moves,
+        _legal_moves_array,
+        _apply_move,
+        _apply_move_hash,
+        _is_lose,
+        _perft,
+    ):
+        kernel.recompile()
+
+
+# State / Position が使う実装
+#   legal_moves(own_men, own_kings, opp, color) -> [move, ...]
+#   apply_move_hash(red_men, red_kings, blue_men, blue_kings, move) -> (bits, ハッシュ差分)
+#   is_lose(own_men, own_kings, opp, color) -> bool
+if AVAILABLE:
+    _check_cache()
+    legal_moves = _jit_legal_moves
+    apply_move_hash = _jit_apply_move_hash
+    is_lose = _jit_is_lose
+else:
+    legal_moves = bitboard.legal_moves
+    apply_move_hash = _py_apply_move_hash
+    is_lose = _py_is_lose
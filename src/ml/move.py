@@ -0,0 +1,69 @@
+# パック形式の指し手 (int) と、外部向けの形式との変換
+#
+# 探索・学習では指し手を bitboard.pack_move の int で扱い、
+#   - NN のポリシー index（dual_network.action_to_index と同じ値）
+#   - API / 対話用の (fr, fc, tr, tc, captured_list) タプル
+# が必要なところでだけ変換する。
+
+from src.ml.bitboard import (
+    BOARD_SIZE,
+    RED,
+    FULL_MASK,
+    SQUARES,
+    SQUARE_INDEX,
+    MOVE_TO_SHIFT,
+    pack_move,
+    move_from,
+    move_to,
+    move_captured,
+    jump_path,
+)
+
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE  # 36（白マスも含む）
+
+# (移動元, 移動先) の下位 10bit -> ポリシー index の事前計算表
+# index = (fr * 6 + fc) * 36 + (tr * 6 + tc)  （dual_network.action_to_index と同じ）
+MOVE_INDEX = [0] * (1 << (2 * MOVE_TO_SHIFT))
+for _f, (_fr, _fc) in enumerate(SQUARES):
+    for _t, (_tr, _tc) in enumerate(SQUARES):
+        MOVE_INDEX[_f | _t << MOVE_TO_SHIFT] = (_fr * BOARD_SIZE + _fc) * NUM_CELLS + (
+            _tr * BOARD_SIZE + _tc
+        )
+_INDEX_MASK = len(MOVE_INDEX) - 1
+
+
+def move_index(move: int) -> int:
+    """パック形式の手 -> ポリシーベクトル上の index"""
+    return MOVE_INDEX[move & _INDEX_MASK]
+
+
+def move_indices(moves):
+    """手のリスト -> index のリスト"""
+    return [MOVE_INDEX[m & _INDEX_MASK] for m in moves]
+
+
+def action_to_move(action) -> int:
+    """(fr, fc, tr, tc, captured_list) -> パック形式の手"""
+    fr, fc, tr, tc, captured = action
+    cap = 0
+    for cr, cc in captured:
+        cap |= 1 << SQUARE_INDEX[cr][cc]
+    return pack_move(SQUARE_INDEX[fr][fc], SQUARE_INDEX[tr][tc], cap)
+
+
+def move_to_action(move: int, state):
+    """
+    パック形式の手 -> (fr, fc, tr, tc, captured_list)（API レスポンス用）
+    state: その手を指す前の局面（取った駒の順番の復元に使う）
+    """
+    from_sq = move_from(move)
+    fr, fc = SQUARES[from_sq]
+    tr, tc = SQUARES[move_to(move)]
+    if not move_captured(move):
+        return (fr, fc, tr, tc, [])
+
+    red_men, red_kings, blue_men, blue_kings = state.bits
+    own_kings = red_kings if state.turn == RED else blue_kings
+    empty = FULL_MASK & ~(red_men | red_kings | blue_men | blue_kings)
+    path = jump_path(move, bool(own_kings >> from_sq & 1), state.turn, empty)
+    return (fr, fc, tr, tc, [SQUARES[sq] for sq in path])
@@ -0,0 +1,204 @@
+# 合法手生成の perft（指定手数先の末端局面数の数え上げ）
+#
+# checker_state.py やビットボードを高速化したときの
+#   - 速度（1秒あたりの局面数）の計測
+#   - 正しさ（局面数・取る手・多段ジャンプ・昇格の数）の回帰チェック
+# に使う。期待値は従来の 6x6 2次元リスト版 State で数えた値。
+# 実装（エンジン）どうし、または期待値と数が合わなければ終了コード 1 で終わる。
+#
+#   python -m src.ml.perft --depth 6
+#   python -m src.ml.perft --depth 8 --engine position
+
+from src.ml.checker_state import State
+from src.ml.position import Position
+from src.ml import jit_moves
+from src.ml.bitboard import RED, PROMOTION_MASK, move_from, move_to, move_captured
+
+import argparse
+import sys
+import time
+
+# 検証用の局面: (名前, 盤面, 手番, 深さ 1, 2, ... の期待局面数)
+# 期待値がない深さでは、エンジンどうしの比較だけを行う
+PERFT_POSITIONS = [
+    (
+        "initial",
+        None,
+        RED,
+        [5, 25, 106, 369, 1271, 4096, 12373, 36899, 102348],
+    ),
+    (
+        "multi_jump",  # 3連続ジャンプ（途中で昇格してキングの向きに曲がる）
+        [
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 1, 0, 0, 0],
+            [0, -1, 0, -1, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, -1, 0, -1, 0, 0],
+            [-1, 0, 0, 0, -1, 0],
+        ],
+        1,
+        [2, 10, 13, 31, 23, 77, 159],
+    ),
+    (
+        "promotion_jump",  # BLUE 通常駒が最上段でキング扱いになって2つ目を取る
+        [
+            [0, 1, 0, 0, 0, 1],
+            [0, 0, 1, 0, 1, 0],
+            [0, -1, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, -1, 0, 0],
+            [-1, 0, 0, 0, 0, 0],
+        ],
+        -1,
+        [1, 3, 9, 19, 43, 63, 148, 234],
+    ),
+    (
+        "kings",
+        [
+            [0, 1, 0, 2, 0, 0],
+            [0, 0, 1, 0, 1, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, -1, 0, -1, 0],
+            [0, -2, 0, 0, 0, 0],
+            [-1, 0, 0, 0, 2, 0],
+        ],
+        -1,
+        [6, 23, 85, 240, 795, 2916, 8712],
+    ),
+    (
+        "king_endgame",
+        [
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, -2, 0],
+            [0, 2, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, -2, 0, 0],
+            [0, 0, 2, 0, 0, 0],
+        ],
+        1,
+        [1, 4, 24, 33, 135, 434, 2060],
+    ),
+]
+
+
+def _new_counts():
+    # nodes: 末端局面数 / captures, multi_jumps, promotions: 最後の1手の内訳
+    return {"nodes": 0, "captures": 0, "multi_jumps": 0, "promotions": 0}
+
+
+def _count_last_moves(moves, own_men, turn, counts):
+    counts["nodes"] += len(moves)
+    promotion_mask = PROMOTION_MASK[turn]
+    for move in moves:
+        captured = move_captured(move)
+        if captured:
+            counts["captures"] += 1
+            if captured & (captured - 1):
+                counts["multi_jumps"] += 1
+        if own_men >> move_from(move) & 1 and promotion_mask >> move_to(move) & 1:
+            counts["promotions"] += 1
+
+
+# State.next() で1手ずつ新しい局面を作る版
+def perft_state(state: State, depth: int, counts):
+    moves = state.legal_moves()
+    if depth == 1:
+        own_men = state.red_men if state.turn == RED else state.blue_men
+        _count_last_moves(moves, own_men, state.turn, counts)
+        return
+    for move in moves:
+        perft_state(state.next(move), depth - 1, counts)
+
+
+# Position.push() / pop() でその場で進める・戻す版
+def perft_position(pos: Position, depth: int, counts):
+    moves = pos.legal_moves()
+    if depth == 1:
+        own_men = pos.pieces[0] if pos.turn == RED else pos.pieces[2]
+        _count_last_moves(moves, own_men, pos.turn, counts)
+        return
+    for move in moves:
+        pos.push(move)
+        perft_position(pos, depth - 1, counts)
+        pos.pop()
+
+
+def _run_state(state: State, depth: int):
+    counts = _new_counts()
+    perft_state(state, depth, counts)
+    return counts
+
+
+def _run_position(state: State, depth: int):
+    counts = _new_counts()
+    perft_position(Position(state), depth, counts)
+    return counts
+
+
+# 探索全体を JIT コンパイルしたカーネルで数える版（Numba があるときだけ）
+def _run_numba(state: State, depth: int):
+    return jit_moves.perft(state.bits, state.turn, depth)
+
+
+# 比較するエンジン（名前 -> (開始局面, 深さ) を受け取って内訳を返す関数）
+# 新しい合法手生成を追加したらここに登録する
+ENGINES = {
+    "state": _run_state,
+    "position": _run_position,
+}
+if jit_moves.AVAILABLE:
+    ENGINES["numba"] = _run_numba
+
+
+def run_perft(depth: int, engine_names):
+    """全ての検証局面で perft を実行し、不一致があれば False を返す"""
+    ok = True
+    for name, board, turn, expected in PERFT_POSITIONS:
+        state = State(board, turn)
+        results = {}
+        for engine in engine_names:
+            start = time.perf_counter()
+            counts = ENGINES[engine](state, depth)
+            elapsed = time.perf_counter() - start
+            results[engine] = counts
+            nps = counts["nodes"] / elapsed if elapsed > 0 else float("inf")
+            print(
+                f"{name:<15} depth={depth} engine={engine:<9} "
+                f"nodes={counts['nodes']:>9} captures={counts['captures']:>8} "
+                f"multi_jumps={counts['multi_jumps']:>7} promotions={counts['promotions']:>7} "
+                f"time={elapsed:.3f}s nps={nps:,.0f}"
+            )
+
+            if depth <= len(expected) and counts["nodes"] != expected[depth - 1]:
+                print(f"NG: {name} の局面数が期待値 {expected[depth - 1]} と一致しません")
+                ok = False
+
+        # エンジンどうしで内訳まで一致するか
+        first = engine_names[0]
+        for engine in engine_names[1:]:
+            if results[engine] != results[first]:
+                print(f"NG: {name} で {first} と {engine} の結果が一致しません")
+                ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="6x6 チェッカーの perft")
+    parser.add_argument("--depth", type=int, default=6, help="探索する手数")
+    parser.add_argument(
+        "--engine",
+        choices=["all", *ENGINES],
+        default="all",
+        help="使う合法手生成（all なら全て実行して比較）",
+    )
+    args = parser.parse_args()
+
+    engine_names = list(ENGINES) if args.engine == "all" else [args.engine]
+    if not run_perft(args.depth, engine_names):
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
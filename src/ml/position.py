@@ -0,0 +1,143 @@
+# 探索用の可変局面（push / pop で1手進める・戻す）
+#
+# State.next() は1手ごとに新しい State を作るが、深い木探索や αβ探索では
+# そのアロケーションが支配的になる。Position は1つのオブジェクトを使い回し、
+# push(move) で盤面をその場で書き換え、pop() で直前の手を取り消す。
+# 取り消しに必要な情報（動かした駒・取った駒・昇格・手番・ハッシュ）は undo スタックに積む。
+
+from src.ml import jit_moves, zobrist
+from src.ml.bitboard import (
+    RED,
+    BLUE,
+    DRAW_TURN_COUNT,
+    PROMOTION_MASK,
+    iter_bits,
+    move_from,
+    move_to,
+    move_captured,
+)
+from src.ml.checker_state import State
+from src.ml.move import action_to_move
+
+from numbers import Integral
+
+# self.pieces の index（State.bits と同じ順）
+RED_MEN, RED_KINGS, BLUE_MEN, BLUE_KINGS = range(4)
+
+
+class Position:
+    def __init__(self, state: State = None):
+        """
+        state: 開始局面（None なら初期配置）
+        """
+        if state is None:
+            state = State()
+        self.pieces = list(state.bits)  # [red_men, red_kings, blue_men, blue_kings]
+        self.turn = state.turn
+        self.turn_count = state.turn_count
+        self.zobrist = state.zobrist
+        # (動かした駒の種類, 移動元bit, 移動先bit, 取った通常駒, 取ったキング, 昇格したか, 手番, 直前のハッシュ)
+        self.undo_stack = []
+
+    # 現在の局面を immutable な State として取り出す
+    def to_state(self) -> State:
+        return State.from_bits(
+            tuple(self.pieces), self.turn, self.turn_count, zobrist_hash=self.zobrist
+        )
+
+    # 現在手番プレイヤーの合法手一覧（State.legal_moves と同じ形式・順序）
+    def legal_moves(self):
+        p = self.pieces
+        if self.turn == RED:
+            return jit_moves.legal_moves(
+                p[RED_MEN], p[RED_KINGS], p[BLUE_MEN] | p[BLUE_KINGS], RED
+            )
+        return jit_moves.legal_moves(
+            p[BLUE_MEN], p[BLUE_KINGS], p[RED_MEN] | p[RED_KINGS], BLUE
+        )
+
+    # 負け判定：自分の駒がない or 合法手がない
+    def is_lose(self) -> bool:
+        p = self.pieces
+        if self.turn == RED:
+            return jit_moves.is_lose(
+                p[RED_MEN], p[RED_KINGS], p[BLUE_MEN] | p[BLUE_KINGS], RED
+            )
+        return jit_moves.is_lose(
+            p[BLUE_MEN], p[BLUE_KINGS], p[RED_MEN] | p[RED_KINGS], BLUE
+        )
+
+    def is_draw(self) -> bool:
+        return self.turn_count >= DRAW_TURN_COUNT
+
+    def is_done(self) -> bool:
+        return self.is_lose() or self.is_draw()
+
+    # 1手進める（盤面をその場で書き換える）
+    def push(self, move):
+        """
+        move: パック形式の手(int) または (from_r, from_c, to_r, to_c, captured_list)
+        """
+        if isinstance(move, Integral):
+            move = int(move)
+        else:
+            move = action_to_move(move)
+        p = self.pieces
+        keys = zobrist.PIECE_KEYS
+        from_sq = move_from(move)
+        to_sq = move_to(move)
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+        captured = move_captured(move)
+
+        if self.turn == RED:
+            moved = RED_MEN if p[RED_MEN] & from_bit else RED_KINGS
+            opp_men, opp_kings = BLUE_MEN, BLUE_KINGS
+        else:
+            moved = BLUE_MEN if p[BLUE_MEN] & from_bit else BLUE_KINGS
+            opp_men, opp_kings = RED_MEN, RED_KINGS
+        h = self.zobrist ^ keys[moved][from_sq] ^ zobrist.SIDE_KEY
+
+        # 取った駒を通常駒とキングに分けて消す
+        cap_men = captured & p[opp_men]
+        cap_kings = captured & p[opp_kings]
+        for sq in iter_bits(cap_men):
+            h ^= keys[opp_men][sq]
+        for sq in iter_bits(cap_kings):
+            h ^= keys[opp_kings][sq]
+        p[opp_men] ^= cap_men
+        p[opp_kings] ^= cap_kings
+
+        # 駒を動かす（通常駒が最終段に着いたら昇格）
+        promoted = moved in (RED_MEN, BLUE_MEN) and bool(
+            to_bit & PROMOTION_MASK[self.turn]
+        )
+        landed = moved + 1 if promoted else moved
+        p[moved] ^= from_bit
+        p[landed] |= to_bit
+        h ^= keys[landed][to_sq]
+
+        self.undo_stack.append(
+            (moved, from_bit, to_bit, cap_men, cap_kings, promoted, self.turn, self.zobrist)
+        )
+        self.zobrist = h
+        self.turn = -self.turn
+        self.turn_count += 1
+
+    # 直前の1手を取り消す
+    def pop(self):
+        moved, from_bit, to_bit, cap_men, cap_kings, promoted, turn, h = (
+            self.undo_stack.pop()
+        )
+        p = self.pieces
+        p[moved + 1 if promoted else moved] ^= to_bit
+        p[moved] |= from_bit
+        if turn == RED:
+            p[BLUE_MEN] |= cap_men
+            p[BLUE_KINGS] |= cap_kings
+        else:
+            p[RED_MEN] |= cap_men
+            p[RED_KINGS] |= cap_kings
+        self.turn = turn
+        self.turn_count -= 1
+        self.zobrist = h
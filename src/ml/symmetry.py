@@ -0,0 +1,81 @@
+# 盤面の対称性（180度回転 + 色の入れ替え）
+#
+# 初期配置は「盤を180度回して RED と BLUE を入れ替える」と元に戻るので、
+# 局面 P とそれを変換した T(P) は手番側から見て同じ局面になる。
+# 変換で手番も入れ替わるため、各局面の組 {P, T(P)} のうち RED の手番の方を
+# 代表（正規形）とする。NN キャッシュ・置換表・学習データの重複除去で使う。
+#
+# 黒マス番号 i は 17 - i に、6x6 のマス (r, c) は (5 - r, 5 - c) に移るので、
+# ポリシー index (from_cell * 36 + to_cell) は 1295 - index に移る（ベクトルの反転）。
+# 変換は2回で元に戻る。
+
+from src.ml.bitboard import (
+    RED,
+    NUM_SQUARES,
+    SQUARE_BITS,
+    MOVE_TO_SHIFT,
+    MOVE_CAPTURE_SHIFT,
+    pack_move,
+)
+
+import numpy as np
+
+IDENTITY = 0  # 変換なし
+ROTATE_SWAP = 1  # 180度回転 + 色の入れ替え
+
+# 9bit ずつ反転して 18bit のビット順を逆にする
+_HALF = NUM_SQUARES // 2
+_REVERSE_HALF = [int(f"{i:0{_HALF}b}"[::-1], 2) for i in range(1 << _HALF)]
+_HALF_MASK = (1 << _HALF) - 1
+
+
+def mirror_bits(bits: int) -> int:
+    """黒マス i のビットを 17 - i に移す"""
+    return _REVERSE_HALF[bits & _HALF_MASK] << _HALF | _REVERSE_HALF[bits >> _HALF]
+
+
+def transform_bits(bits, transform: int = ROTATE_SWAP):
+    """(red_men, red_kings, blue_men, blue_kings) を変換する"""
+    if transform == IDENTITY:
+        return bits
+    red_men, red_kings, blue_men, blue_kings = bits
+    return (
+        mirror_bits(blue_men),
+        mirror_bits(blue_kings),
+        mirror_bits(red_men),
+        mirror_bits(red_kings),
+    )
+
+
+def transform_move(move: int, transform: int = ROTATE_SWAP) -> int:
+    """パック形式の手を変換後の局面での手に移す"""
+    if transform == IDENTITY:
+        return move
+    last = NUM_SQUARES - 1
+    return pack_move(
+        last - (move & SQUARE_BITS),
+        last - (move >> MOVE_TO_SHIFT & SQUARE_BITS),
+        mirror_bits(move >> MOVE_CAPTURE_SHIFT),
+    )
+
+
+def canonical_transform(turn: int) -> int:
+    """正規形（RED の手番）にするための変換"""
+    return IDENTITY if turn == RED else ROTATE_SWAP
+
+
+def policy_to_canonical(policy, transform: int):
+    """
+    元の局面のポリシー (1296,) または (N, 1296) -> 正規形の局面のポリシー
+    リストを渡した場合はリストで返す。
+    """
+    if transform == IDENTITY:
+        return policy
+    if isinstance(policy, list):
+        return policy[::-1]
+    return np.asarray(policy)[..., ::-1]
+
+
+def policy_from_canonical(policy, transform: int):
+    """正規形の局面のポリシー -> 元の局面のポリシー（変換は2回で元に戻る）"""
+    return policy_to_canonical(policy, transform)
@@ -0,0 +1,302 @@
+# 駒数の少ない局面の終盤データベース（後退解析）
+#
+# 駒が K 個以下の全局面について、完全解析した勝敗と終局までの手数を持つ。
+# 局面は「駒のあるマスの組合せ順位 × 駒の種類の並び × 手番」で
+# 0〜N-1 に隙間なく番号付け（完全ハッシュ）し、1局面 2byte の配列として
+# メモリマップしたファイルに保存する。探索・セルフプレイ・推論 API からは O(1) で引ける。
+#
+#   python -m src.ml.tablebase --pieces 3 --out outputs/tablebase.bin
+#
+# 値は 50 手ルールを考えない無限ゲームでの結果なので、実際の局面の値は
+# value() で手数（turn_count）を考慮して求める。
+
+from src.ml import bitboard
+from src.ml.bitboard import (
+    RED,
+    BLUE,
+    NUM_SQUARES,
+    DRAW_TURN_COUNT,
+    PROMOTION_MASK,
+    iter_bits,
+)
+
+from collections import deque
+from array import array
+from itertools import combinations, product
+from math import comb
+from dotenv import load_dotenv
+import numpy as np
+import argparse
+import os
+
+load_dotenv()
+TABLEBASE_PATH = os.getenv("TABLEBASE_PATH")
+
+# 各局面の値（uint16）= 終局までの手数 << 2 | 結果
+DRAW = 0
+WIN = 1  # 手番側の勝ち
+LOSS = 2  # 手番側の負け
+INVALID = 3  # 到達しない局面（最終段にいる通常駒）
+
+# ファイルヘッダ: マジック(4byte) + バージョン(uint16) + 最大駒数(uint16) + 予備(8byte)
+_MAGIC = b"CKTB"
+_VERSION = 1
+_HEADER_SIZE = 16
+
+# 駒の種類の番号（State.bits と同じ順）
+_RED_MAN, _RED_KING, _BLUE_MAN, _BLUE_KING = range(4)
+
+
+def _block_sizes(max_pieces):
+    """駒数 k ごとの局面数（手番を除く）= C(18, k) * 4^k"""
+    return [comb(NUM_SQUARES, k) * 4**k for k in range(max_pieces + 1)]
+
+
+def table_size(max_pieces: int) -> int:
+    return 2 * sum(_block_sizes(max_pieces))
+
+
+def position_index(bits, turn, max_pieces, offsets) -> int:
+    """
+    局面 -> 0〜table_size-1 の番号（駒数が max_pieces を超えるときは -1）
+    駒のあるマスの組合せは colex 順位 Σ C(sq_i, i) で数える。
+    """
+    red_men, red_kings, blue_men, blue_kings = bits
+    occupied = red_men | red_kings | blue_men | blue_kings
+    k = occupied.bit_count()
+    if k > max_pieces:
+        return -1
+    rank = 0
+    kinds = 0
+    i = 0
+    for sq in iter_bits(occupied):
+        i += 1
+        rank += comb(sq, i)
+        bit = 1 << sq
+        if red_men & bit:
+            kinds = kinds * 4 + _RED_MAN
+        elif red_kings & bit:
+            kinds = kinds * 4 + _RED_KING
+        elif blue_men & bit:
+            kinds = kinds * 4 + _BLUE_MAN
+        else:
+            kinds = kinds * 4 + _BLUE_KING
+    return (offsets[k] + rank * 4**k + kinds) << 1 | (turn == BLUE)
+
+
+def _offsets(max_pieces):
+    offsets = [0]
+    for size in _block_sizes(max_pieces)[:-1]:
+        offsets.append(offsets[-1] + size)
+    return offsets
+
+
+def _iter_positions(max_pieces):
+    """全ての配置 (bits) を駒数の少ない順に列挙する"""
+    for k in range(max_pieces + 1):
+        for squares in combinations(range(NUM_SQUARES), k):
+            for kinds in product(range(4), repeat=k):
+                bits = [0, 0, 0, 0]
+                for sq, kind in zip(squares, kinds):
+                    bits[kind] |= 1 << sq
+                yield tuple(bits)
+
+
+# 後退解析による生成
+def generate(max_pieces: int):
+    """
+    駒が max_pieces 個以下の全局面を解析して uint16 の配列を返す。
+      1. 全局面の合法手の行き先（後続局面の番号）を列挙
+      2. 合法手のない局面（負け）から逆向きにたどり、
+         「負け局面へ行ける局面は勝ち」「全ての手が勝ち局面に行く局面は負け」を
+         手数の短い順に確定させる
+      3. 最後まで確定しなかった局面は引き分け
+    """
+    offsets = _offsets(max_pieces)
+    n = table_size(max_pieces)
+    table = np.full(n, INVALID, dtype=np.uint16)
+    remaining = np.zeros(n, dtype=np.int32)  # 未確定の後続局面の数
+    # 辺のリスト（int64。"l" は Windows では 4 バイトなので "q" を使う）
+    edge_from = array("q")
+    edge_to = array("q")
+    queue = deque()
+
+    for bits in _iter_positions(max_pieces):
+        red_men, red_kings, blue_men, blue_kings = bits
+        # 最終段の通常駒は昇格済みのはずなので存在しない
+        if red_men & PROMOTION_MASK[RED] or blue_men & PROMOTION_MASK[BLUE]:
+            continue
+        for turn in (RED, BLUE):
+            i = position_index(bits, turn, max_pieces, offsets)
+            if turn == RED:
+                moves = bitboard.legal_moves(
+                    red_men, red_kings, blue_men | blue_kings, RED
+                )
+            else:
+                moves = bitboard.legal_moves(
+                    blue_men, blue_kings, red_men | red_kings, BLUE
+                )
+            if not moves:
+                table[i] = LOSS  # 手数 0 の負け
+                queue.append(i)
+                continue
+            table[i] = DRAW
+            remaining[i] = len(moves)
+            for move in moves:
+                child = bitboard.apply_move(*bits, move)
+                edge_from.append(i)
+                edge_to.append(position_index(child, -turn, max_pieces, offsets))
+
+    # 後続局面 -> 元の局面 の逆引き (CSR)
+    edge_from = np.frombuffer(edge_from, dtype=np.int64)
+    edge_to = np.frombuffer(edge_to, dtype=np.int64)
+    order = np.argsort(edge_to, kind="stable")
+    parents = edge_from[order].tolist()
+    starts = np.searchsorted(edge_to[order], np.arange(n + 1)).tolist()
+
+    # 手数の短い順（キューの順）に確定させる
+    distance = np.zeros(n, dtype=np.int32)
+    while queue:
+        i = queue.popleft()
+        d = int(distance[i]) + 1
+        lost = table[i] == LOSS
+        for p in parents[starts[i] : starts[i + 1]]:
+            if table[p] != DRAW or remaining[p] == 0:
+                continue
+            if lost:
+                # 相手を負け局面に送れる → 勝ち（最初に見つかったものが最短）
+                table[p] = WIN
+                remaining[p] = 0
+            else:
+                remaining[p] -= 1
+                if remaining[p]:
+                    continue
+                # 全ての手が相手の勝ちになる → 負け（最後に確定した手が最長）
+                table[p] = LOSS
+            distance[p] = d
+            queue.append(p)
+
+    return (distance.astype(np.uint16) << 2) | table
+
+
+def save(table, max_pieces: int, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    header = _MAGIC + np.array([_VERSION, max_pieces], dtype="<u2").tobytes()
+    with open(path, "wb") as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        f.write(table.astype("<u2").tobytes())
+
+
+# 参照用
+class Tablebase:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+        if header[:4] != _MAGIC:
+            raise ValueError(f"終盤データベースのファイルではありません: {path}")
+        version, self.max_pieces = np.frombuffer(header[4:8], dtype="<u2")
+        if version != _VERSION:
+            raise ValueError(f"未対応のバージョンです: {version}")
+        self.max_pieces = int(self.max_pieces)
+        self.offsets = _offsets(self.max_pieces)
+        self.table = np.memmap(
+            path,
+            dtype="<u2",
+            mode="r",
+            offset=_HEADER_SIZE,
+            shape=(table_size(self.max_pieces),),
+        )
+
+    def probe(self, state):
+        """
+        (結果, 終局までの手数) を返す（50手ルールなし）。
+        駒数が多くて対象外の局面は None。
+        """
+        i = position_index(state.bits, state.turn, self.max_pieces, self.offsets)
+        if i < 0:
+            return None
+        entry = int(self.table[i])
+        result = entry & 3
+        if result == INVALID:
+            return None
+        return result, entry >> 2
+
+    def value(self, state):
+        """
+        手番側から見た真の値 (1: 勝ち, 0: 引き分け, -1: 負け)。対象外なら None。
+        勝敗が決まる前に引き分け手数 (DRAW_TURN_COUNT) に達する場合は引き分け。
+        """
+        hit = self.probe(state)
+        if hit is None:
+            return None
+        result, distance = hit
+        if result == DRAW:
+            return 0
+        if distance > 0 and state.turn_count + distance > DRAW_TURN_COUNT:
+            return 0
+        return 1 if result == WIN else -1
+
+    def best_move(self, state):
+        """
+        データベース上の最善手（勝ちは最短、負けは最長、引き分けは引き分けを保つ手）。
+        対象外の局面や合法手がないときは None。
+        """
+        if self.probe(state) is None or not state.legal_moves():
+            return None
+
+        def score(move):
+            result, distance = self.probe(state.next(move))
+            if result == LOSS:  # 相手の負け
+                return (2, -distance)
+            if result == DRAW:
+                return (1, 0)
+            return (0, distance)  # 相手の勝ち: なるべく長引かせる
+
+        return max(state.legal_moves(), key=score)
+
+
+_tablebase = None
+_tablebase_loaded = False
+
+
+def get_tablebase():
+    """
+    環境変数 TABLEBASE_PATH のデータベースを1度だけ読み込んで返す。
+    設定されていない・ファイルがない場合は None（探索だけで評価する）。
+    """
+    global _tablebase, _tablebase_loaded
+    if not _tablebase_loaded:
+        _tablebase_loaded = True
+        if TABLEBASE_PATH and os.path.exists(TABLEBASE_PATH):
+            _tablebase = Tablebase(TABLEBASE_PATH)
+            print(
+                f"終盤データベースを読み込みました: {TABLEBASE_PATH} "
+                f"(駒数 {_tablebase.max_pieces} 以下)"
+            )
+    return _tablebase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="終盤データベースの生成")
+    parser.add_argument("--pieces", type=int, default=3, help="対象にする最大駒数")
+    parser.add_argument(
+        "--out",
+        default=TABLEBASE_PATH or "outputs/tablebase.bin",
+        help="出力ファイル",
+    )
+    args = parser.parse_args()
+
+    table = generate(args.pieces)
+    save(table, args.pieces, args.out)
+
+    results = table & 3
+    print(
+        f"局面数 {len(table)}: 勝ち {np.sum(results == WIN)} / "
+        f"負け {np.sum(results == LOSS)} / 引き分け {np.sum(results == DRAW)} / "
+        f"最長手数 {int((table >> 2).max())}"
+    )
+    print(f"保存しました: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# 6x6 チェッカー局面の Zobrist ハッシュ
+#
+# (駒の種類, マス) ごとの 64bit 乱数を XOR して局面のハッシュを作る。
+# 駒の種類は State.bits と同じ順 (RED 通常駒, RED キング, BLUE 通常駒, BLUE キング)。
+# 乱数は固定シードで生成するので、プロセスをまたいでも同じ局面は同じ値になる
+# （キャッシュや学習データの重複除去をファイルに保存しても使える）。
+
+from src.ml.bitboard import NUM_SQUARES, BLUE, DRAW_TURN_COUNT, iter_bits
+
+import random
+
+ZOBRIST_SEED = 20251123
+
+_rng = random.Random(ZOBRIST_SEED)
+
+# PIECE_KEYS[駒の種類][マス番号]
+PIECE_KEYS = tuple(
+    tuple(_rng.getrandbits(64) for _ in range(NUM_SQUARES)) for _ in range(4)
+)
+# BLUE の手番のときに XOR する値
+SIDE_KEY = _rng.getrandbits(64)
+# 手数（0〜DRAW_TURN_COUNT、それ以上は DRAW_TURN_COUNT に丸める）
+TURN_COUNT_KEYS = tuple(_rng.getrandbits(64) for _ in range(DRAW_TURN_COUNT + 1))
+
+
+def hash_bits(bits, turn) -> int:
+    """ビットボード (red_men, red_kings, blue_men, blue_kings) と手番からハッシュを計算"""
+    h = SIDE_KEY if turn == BLUE else 0
+    for keys, b in zip(PIECE_KEYS, bits):
+        for sq in iter_bits(b):
+            h ^= keys[sq]
+    return h
+
+
+def diff(old_bits, new_bits) -> int:
+    """
+    2つのビットボードのハッシュ差分（変化したマスの分だけ XOR する）。
+    1手で変わるのは 移動元・移動先・取った駒 だけなので O(変化した駒数)。
+    """
+    h = 0
+    for keys, old, new in zip(PIECE_KEYS, old_bits, new_bits):
+        for sq in iter_bits(old ^ new):
+            h ^= keys[sq]
+    return h
+
+
+def turn_count_key(turn_count: int) -> int:
+    """手数のキー（引き分け判定に影響しない DRAW_TURN_COUNT 以上は同じ値）"""
+    return TURN_COUNT_KEYS[min(turn_count, DRAW_TURN_COUNT)]
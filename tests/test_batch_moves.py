@@ -0,0 +1,47 @@
+# batch_moves.batch_legal_moves のテスト（State.legal_actions() と一致するか）
+
+from src.ml.checker_state import State
+from src.ml.batch_moves import batch_legal_moves, ACTION_SIZE
+
+import numpy as np
+import random
+
+
+# State.legal_actions() から期待値 (mask, captures) を作る
+def _expected(state: State):
+    mask = np.zeros(ACTION_SIZE, dtype=bool)
+    captures = {}
+    for fr, fc, tr, tc, captured in state.legal_actions():
+        index = (fr * 6 + fc) * 36 + tr * 6 + tc
+        mask[index] = True
+        if captured:
+            captures.setdefault(index, []).append(captured)
+    return mask, captures
+
+
+def test_matches_legal_actions():
+    rng = random.Random(0)
+    states = []
+    for _ in range(20):
+        state = State()
+        while not state.is_done():
+            states.append(state)
+            state = state.next(rng.choice(state.legal_moves()))
+        states.append(state)
+
+    boards = np.array([state.board for state in states], dtype=np.int8)
+    turns = np.array([state.turn for state in states])
+    masks, captures = batch_legal_moves(boards, turns)
+
+    assert masks.shape == (len(states), ACTION_SIZE)
+    for state, mask, capture in zip(states, masks, captures):
+        expected_mask, expected_captures = _expected(state)
+        assert (mask == expected_mask).all()
+        assert capture == expected_captures
+
+
+def test_empty_batch():
+    masks, captures = batch_legal_moves(np.zeros((0, 6, 6), dtype=np.int8), [])
+    assert masks.shape == (0, ACTION_SIZE)
+    assert masks.dtype == bool
+    assert captures == []
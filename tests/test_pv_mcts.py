@@ -0,0 +1,144 @@
+# PVMCTSSearch のテスト（NN は一様なポリシー・価値 0 を返すだけのモデルで置き換える）
+
+from src.ml.checker_state import State
+from src.ml.move import move_index
+from src.ml.alpha_zero import pv_mcts
+from src.ml.alpha_zero.mcts_tree import ROOT
+
+import numpy as np
+import pytest
+import time
+
+
+# 一様なポリシー・価値 0 を返すモデル
+class UniformModel:
+    def predict(self, x, batch_size=None, verbose=0):
+        n = len(x)
+        return np.ones((n, 1296), dtype=np.float32), np.zeros((n, 1), dtype=np.float32)
+
+
+# index の手だけポリシーを大きくしたモデル
+class SkewedModel(UniformModel):
+    def __init__(self, index):
+        self.index = index
+
+    def predict(self, x, batch_size=None, verbose=0):
+        policies, values = super().predict(x)
+        policies[:, self.index] = 100
+        return policies, values
+
+
+# 手数が min_turn_count 以上の局面を全て value とみなす終盤データベース
+class FixedTablebase:
+    def __init__(self, value, min_turn_count=2):
+        self._value = value
+        self.min_turn_count = min_turn_count
+
+    def value(self, state):
+        if state.turn_count < self.min_turn_count:
+            return None
+        return self._value
+
+
+# 探索木の2手先（自分の手・相手の手）にある、データベースで評価した葉の局面
+def _tablebase_leaf(tree, min_visits=1):
+    for slot in range(tree.size):
+        state = tree.states[slot]
+        owner = tree.link[slot]
+        if (
+            state is not None
+            and state.turn_count == 2
+            and not tree.is_expanded(owner)
+            and tree.node_N[owner] >= min_visits
+        ):
+            return state
+    raise AssertionError("データベースの葉が探索木にない")
+
+
+# 合法手ごとの確率として使えるスコアか
+def _assert_distribution(scores, state):
+    assert len(scores) == len(state.legal_moves())
+    assert np.isclose(sum(scores), 1)
+    np.random.choice(len(scores), p=scores)
+
+
+def test_deadline_on_rerooted_tablebase_leaf(monkeypatch):
+    # 引き分けの葉は確定しないので何度も選ばれ、展開されないまま node_N が増える
+    monkeypatch.setattr(pv_mcts, "get_tablebase", lambda: FixedTablebase(0))
+    search = pv_mcts.PVMCTSSearch(UniformModel(), evaluate_count=200, batch_size=1)
+    search.scores(State(), 1.0)
+
+    state = _tablebase_leaf(search.tree, min_visits=2)
+    # 時間切れでもルートは展開してからスコアを作る
+    scores = search.scores(state, 1.0, deadline=time.monotonic() - 1)
+    assert search.tree.is_expanded(ROOT)
+    _assert_distribution(scores, state)
+
+
+@pytest.mark.parametrize("value", [1, -1])
+def test_reroot_on_proven_tablebase_leaf(monkeypatch, value):
+    # 2手先の局面が全てデータベースで勝ち（負け）→ 木を引き継いだルートが展開前に確定している
+    monkeypatch.setattr(pv_mcts, "get_tablebase", lambda: FixedTablebase(value))
+    search = pv_mcts.PVMCTSSearch(UniformModel(), evaluate_count=200, batch_size=1)
+    search.scores(State(), 1.0)
+
+    state = _tablebase_leaf(search.tree)
+    tree = search.tree
+    assert tree.proven[tree.link[tree.find(state)]] == value
+    for temperature in (0, 1.0):
+        scores = search.scores(state, temperature)
+        _assert_distribution(scores, state)
+
+
+def test_proven_win_keeps_visit_distribution(monkeypatch):
+    # 2手先の局面が全てデータベースで勝ち → 初期局面は何手か探索したあとで勝ちが確定する
+    monkeypatch.setattr(pv_mcts, "get_tablebase", lambda: FixedTablebase(1))
+    search = pv_mcts.PVMCTSSearch(UniformModel(), evaluate_count=200, batch_size=1)
+    state = State()
+    scores = search.scores(state, 1.0)
+    tree = search.tree
+    assert tree.proven[ROOT] == 1
+
+    # 温度 > 0 では訪問回数の分布のまま
+    assert scores == pv_mcts.boltzman(tree.child_visits(ROOT), 1.0)
+    assert max(scores) < 1
+
+    # 温度 0 では相手の負けが確定する手だけ
+    scores = search.scores(state, 0)
+    assert scores[tree.child_proven(ROOT).index(-1)] == 1
+    _assert_distribution(scores, state)
+
+
+def test_skip_move_proven_lost_after_visits(monkeypatch):
+    # 訪問回数が溜まったあとで、最多訪問の手の負け（相手の勝ち）が確定した
+    tablebase = FixedTablebase(0, min_turn_count=99)  # どの局面も引かない
+    monkeypatch.setattr(pv_mcts, "get_tablebase", lambda: tablebase)
+    search = pv_mcts.PVMCTSSearch(UniformModel(), evaluate_count=200, batch_size=1)
+    state = State()
+    search.scores(state, 1.0)
+    tree = search.tree
+    visits = tree.child_visits(ROOT)
+    best = int(np.argmax(visits))
+    tree.proven[tree.link[tree.first_child[ROOT] + best]] = 1
+    assert not tree.proven[ROOT]
+
+    search.evaluate_count = 1
+    for temperature in (0, 1.0):
+        scores = search.scores(state, temperature)
+        assert scores[best] == 0
+        _assert_distribution(scores, state)
+
+
+def test_search_stats_keep_saved_simulations(monkeypatch):
+    # pv_mcts_scores は探索を捨てるが、省いた回数は累計に残る
+    monkeypatch.setattr(pv_mcts, "get_tablebase", lambda: None)
+    state = State()
+    before = pv_mcts.search_stats()
+    # 1手だけポリシーが大きい → 訪問回数がその手に偏り、途中で打ち切れる
+    model = SkewedModel(move_index(state.legal_moves()[0]))
+    pv_mcts.pv_mcts_scores(state, model, 0, evaluate_count=200, batch_size=1)
+    after = pv_mcts.search_stats()
+    simulations = after["simulations"] - before["simulations"]
+    saved = after["saved_simulations"] - before["saved_simulations"]
+    assert saved > 0
+    assert simulations + saved == 200